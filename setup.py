@@ -27,7 +27,8 @@ def read_file(filename):
 setup(
     name='simocollector',
     version=version,
-    packages=find_packages(),
+    packages=find_packages(exclude=['tests']),
+    package_data={'simocollector.benchmarks': ['baseline.json']},
     url='https://github.com/rbas/simocollector',
     license=read_file('LICENSE'),
     author='Martin Voldrich',
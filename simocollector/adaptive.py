@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Intervals of the daemon adapted to the collected values.
+
+After every report the interval of its collection is halved when the values
+changed fast since the previous report or crossed a threshold, and doubled
+back towards the configured interval when they are stable. Intervals are
+shortened only as long as all collections together stay within a budget of
+reports per hour.
+
+"""
+__all__ = ['DEFAULT_VOLATILITY', 'DEFAULT_MAX_SPEEDUP', 'DEFAULT_MIN_INTERVAL', 'DEFAULT_THRESHOLDS',
+           'numeric_values', 'relative_change', 'crosses_thresholds', 'AdaptiveScheduler']
+
+from simocollector.records import Record
+
+
+# Relative change of a value between two reports considered fast
+DEFAULT_VOLATILITY = 0.25
+
+# Intervals are shortened to at most 1/8 of the configured ones, and not under 30 seconds
+DEFAULT_MAX_SPEEDUP = 8
+DEFAULT_MIN_INTERVAL = 30
+
+# Budget of reports per hour as a multiple of the reports of the configured intervals
+DEFAULT_BUDGET_FACTOR = 2
+
+# Value of a field over which a collection is reported more often, either a
+# number or a name of another field of the same object
+DEFAULT_THRESHOLDS = {
+    'loadavg': {'minute': 'cores'},
+    'memory': {'percent_used': 90, 'swap_percent_used': 50},
+    'cpu': {'iowait': 20, 'steal': 20},
+}
+
+# Fields which are not measured values
+IGNORED_FIELDS = ('created', 'server')
+
+# Changes of counters between reports, small ones swing by more than any volatility
+# from report to report, their cumulative counters are compared instead
+DERIVED_SUFFIXES = ('_delta', '_per_sec')
+
+
+def _is_number(value):
+    return isinstance(value, (int, long, float)) and not isinstance(value, bool)
+
+
+def numeric_values(data):
+    """
+    Return ``{key: value}`` of the numeric fields of a sent object, or of
+    all objects of a list, which are told apart by their string fields
+    (disk, device, cgroup, ...). Changes of counters (``*_delta``,
+    ``*_per_sec``) are left out.
+
+    """
+    if isinstance(data, (dict, Record)):
+        return dict((field, value) for field, value in data.iteritems()
+                    if field not in IGNORED_FIELDS and not field.endswith(DERIVED_SUFFIXES) and
+                    _is_number(value))
+
+    values = {}
+    for row in data or ():
+        identity = tuple(sorted((field, value) for field, value in row.iteritems()
+                                if field not in IGNORED_FIELDS and isinstance(value, basestring)))
+        for field, value in numeric_values(row).iteritems():
+            values[(identity, field)] = value
+    return values
+
+
+def relative_change(previous, current):
+    """
+    The biggest relative change of a value present in both readings.
+
+    """
+    change = 0.0
+    for key, value in current.iteritems():
+        if key in previous:
+            old = previous[key]
+            change = max(change, abs(value - old) / float(max(abs(old), abs(value), 1)))
+    return change
+
+
+def crosses_thresholds(data, thresholds):
+    rows = [data] if isinstance(data, (dict, Record)) else data or ()
+    for row in rows:
+        for field, limit in thresholds.iteritems():
+            if isinstance(limit, basestring):
+                limit = row.get(limit)
+            value = row.get(field)
+            if _is_number(value) and _is_number(limit) and value > limit:
+                return True
+    return False
+
+
+class AdaptiveScheduler(object):
+    """
+    Adapter of intervals of the daemon ``jobs``, configured by
+    ``adaptive_volatility``, ``adaptive_thresholds`` (merged into
+    ``DEFAULT_THRESHOLDS``), ``adaptive_max_speedup``,
+    ``adaptive_min_interval`` and ``adaptive_budget`` (reports per hour).
+
+    """
+
+    def __init__(self, jobs, config):
+        self.jobs = jobs
+        self.base_intervals = dict((job.name, job.interval) for job in jobs)
+        self.volatility = float(config.get('adaptive_volatility', DEFAULT_VOLATILITY))
+        self.max_speedup = float(config.get('adaptive_max_speedup', DEFAULT_MAX_SPEEDUP))
+        self.min_interval = float(config.get('adaptive_min_interval', DEFAULT_MIN_INTERVAL))
+
+        self.thresholds = dict((name, dict(fields)) for name, fields in DEFAULT_THRESHOLDS.iteritems())
+        for name, fields in config.get('adaptive_thresholds', {}).iteritems():
+            self.thresholds.setdefault(name, {}).update(fields)
+
+        self.budget = float(config.get('adaptive_budget', DEFAULT_BUDGET_FACTOR * self.get_rate()))
+        self._previous = {}
+
+    def get_rate(self):
+        return sum(3600.0 / job.interval for job in self.jobs)
+
+    def get_shortest_interval(self, job):
+        base = self.base_intervals[job.name]
+        return min(base, max(base / self.max_speedup, self.min_interval))
+
+    def is_busy(self, job, data):
+        values = numeric_values(data)
+        previous = self._previous.get(job.name)
+        self._previous[job.name] = values
+
+        if crosses_thresholds(data, self.thresholds.get(job.name, {})):
+            return True
+        return previous is not None and relative_change(previous, values) > self.volatility
+
+    def adapt(self, job, data):
+        """
+        Set new interval of ``job`` after it reported ``data``, return it.
+
+        """
+        if self.is_busy(job, data):
+            interval = max(job.interval / 2.0, self.get_shortest_interval(job))
+            rate = self.get_rate() - 3600.0 / job.interval + 3600.0 / interval
+            if rate > self.budget:
+                interval = job.interval
+        else:
+            interval = min(job.interval * 2.0, self.base_intervals[job.name])
+
+        if interval != job.interval:
+            job.next_run += interval - job.interval
+            job.interval = interval
+        return interval
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Spreading of the requests of a fleet of collectors.
+
+Every host delays its collections by an offset derived from its
+``server_id``, the same on every run, so hosts with the same schedule do not
+post at the same second. The offset is limited by a share of the interval
+of the collection. Payloads refused with 429 or 503 are sent again
+after the delay asked by ``Retry-After``, or after an exponentially growing
+one, as long as the retry budget of the cycle lasts.
+
+"""
+__all__ = ['DEFAULT_INTERVALS', 'DEFAULT_JITTER', 'DAEMON_JITTER_SHARE', 'ONE_SHOT_JITTER_SHARE', 'DEFAULT_RETRIES',
+           'DEFAULT_RETRY_WAIT', 'DEFAULT_RETRY_DELAY', 'RETRY_CODES', 'get_intervals', 'get_jitter',
+           'get_one_shot_jitter', 'get_retry_after', 'is_retryable', 'RetryBudget']
+
+import time
+import random
+import socket
+import hashlib
+import urllib2
+import threading
+from email.utils import parsedate_tz, mktime_tz
+
+
+# Same cadence as the cron jobs written by install-simocollection.py (seconds)
+DEFAULT_INTERVALS = {
+    'loadavg': 2 * 60,
+    'networktraffic': 6 * 60,
+    'cpu': 5 * 60,
+    'memory': 9 * 60,
+    'diskusage': 3 * 60 * 60,
+    'diskio': 10 * 60,
+    'selfstats': 15 * 60,
+    'cgroups': 2 * 60,
+    'processes': 5 * 60,
+}
+
+# Maximal offset of the collections of a host (seconds)
+DEFAULT_JITTER = 60
+
+# Share of the interval the offset may take in the daemon, and in one-shot runs,
+# which have to finish (timeout and retries included) before cron starts the next one
+DAEMON_JITTER_SHARE = 0.5
+ONE_SHOT_JITTER_SHARE = 0.25
+
+# Retries of one cycle of collections, and seconds they may wait altogether
+DEFAULT_RETRIES = 3
+DEFAULT_RETRY_WAIT = 10
+
+# Delay before the first retry without Retry-After, doubled by every next one
+DEFAULT_RETRY_DELAY = 1
+
+# Responses of a server asking to slow down
+RETRY_CODES = (429, 503)
+
+
+def get_intervals(config):
+    intervals = dict(DEFAULT_INTERVALS)
+    for name, interval in config.get('intervals', {}).iteritems():
+        if name not in DEFAULT_INTERVALS:
+            raise Exception('Collection {0} is not allowed.'.format(name))
+        interval = int(interval)
+        if interval <= 0:
+            raise Exception('Interval of collection {0} must be positive.'.format(name))
+        intervals[name] = interval
+
+    return intervals
+
+
+def get_jitter(config, name, interval=None, share=DAEMON_JITTER_SHARE):
+    """
+    Offset (seconds) of collection ``name`` of this host, under
+    ``send_jitter`` of the configuration and ``share`` of ``interval``.
+
+    """
+    limit = float(config.get('send_jitter', DEFAULT_JITTER))
+    if interval:
+        limit = min(limit, interval * share)
+    if limit <= 0:
+        return 0.0
+
+    host = config.get('server_id') or socket.gethostname()
+    digest = hashlib.md5('{0}:{1}'.format(host, name)).hexdigest()
+    return int(digest[:8], 16) / float(0x100000000) * limit
+
+
+def get_one_shot_jitter(config, types):
+    """
+    Offset (seconds) of a one-shot run of collections ``types``, well before
+    the next run of the shortest of their intervals.
+
+    """
+    intervals = get_intervals(config)
+    return get_jitter(config, ' '.join(types), min(intervals[name] for name in types), ONE_SHOT_JITTER_SHARE)
+
+
+def get_retry_after(e):
+    """
+    Seconds to wait asked by the ``Retry-After`` header of HTTP error
+    ``e``, ``None`` without it.
+
+    """
+    headers = getattr(e, 'headers', None) if isinstance(e, urllib2.HTTPError) else None
+    value = headers.get('Retry-After') if headers is not None else None
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    return max(mktime_tz(date) - time.time(), 0.0)
+
+
+def is_retryable(e):
+    return isinstance(e, urllib2.HTTPError) and e.code in RETRY_CODES
+
+
+class RetryBudget(object):
+    """
+    Retries shared by the senders of one cycle: at most ``retries`` of them,
+    waiting at most ``wait`` seconds altogether. Delays start at ``delay``.
+
+    """
+
+    def __init__(self, retries=DEFAULT_RETRIES, wait=DEFAULT_RETRY_WAIT, delay=DEFAULT_RETRY_DELAY):
+        self.retries = retries
+        self.wait = wait
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Budget of ``retry_budget`` retries waiting ``retry_max_wait`` seconds,
+        starting at ``retry_delay`` seconds.
+
+        """
+        return cls(int(config.get('retry_budget', DEFAULT_RETRIES)),
+                   float(config.get('retry_max_wait', DEFAULT_RETRY_WAIT)),
+                   float(config.get('retry_delay', DEFAULT_RETRY_DELAY)))
+
+    def get_delay(self, e, attempt):
+        """
+        Seconds to wait before retry ``attempt`` (from 0) after error ``e``.
+
+        """
+        retry_after = get_retry_after(e)
+        if retry_after is not None:
+            return retry_after
+        # Randomized, so that hosts refused at the same time do not come back at the same time
+        return random.uniform(0.5, 1.0) * self.delay * 2 ** attempt
+
+    def acquire(self, delay):
+        """
+        Take a retry waiting ``delay`` seconds from the budget, return False
+        when it is spent.
+
+        """
+        with self._lock:
+            if self.retries <= 0 or delay > self.wait:
+                return False
+            self.retries -= 1
+            self.wait -= delay
+            return True
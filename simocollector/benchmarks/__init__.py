@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of SIMO Collector. They run against the local mock SIMO server,
+so no real server (nor network) is needed.
+
+"""
+import os
+import json
+import tempfile
+
+from simocollector.utils import percentile
+
+
+def median(values):
+    return percentile(values, 50)
+
+
+def build_config(server_url, work_dir=None):
+    """
+    Configuration sending every local disk and network device to
+    ``server_url``, keeping spool and state in ``work_dir``.
+
+    """
+    from simocollector.collectors import system_info_collector
+
+    work_dir = work_dir or tempfile.mkdtemp(prefix='simo-benchmark-')
+
+    disk = {}
+    for name in system_info_collector.get_disk_io():
+        disk[name] = '{0}/api/disk/{1}/'.format(server_url, name)
+    # Disk usage is keyed by the device of the partition
+    for device in system_info_collector.get_disk_usage(['/']):
+        disk[device] = '{0}/api/disk/{1}/'.format(server_url, device.replace('/dev/', ''))
+
+    networkdevices = {}
+    for name in system_info_collector.get_network_traffic():
+        networkdevices[name] = '{0}/api/network-device/{1}/'.format(server_url, name)
+
+    return {
+        'server': server_url,
+        'server_id': '{0}/api/server/1/'.format(server_url),
+        'username': 'simo',
+        'password': 'simo',
+        'disk': disk,
+        'path_list': ['/'],
+        'networkdevices': networkdevices,
+        'spool_dir': os.path.join(work_dir, 'spool'),
+        'state_dir': os.path.join(work_dir, 'state'),
+    }
+
+
+def write_config(config, work_dir):
+    path = os.path.join(work_dir, 'collector.conf')
+    with open(path, 'w') as f:
+        json.dump(config, f)
+    return path
+
+
+def print_table(header, rows):
+    widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header))]
+    for row in [header] + rows:
+        print('  '.join(str(value).rjust(width) for value, width in zip(row, widths)))
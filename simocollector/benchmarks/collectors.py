@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the collectors and senders against a synthetic procfs tree
+(see ``simocollector.benchmarks.fakeproc``) of 10, 1000 and 10000 disks,
+network devices and processes::
+
+  $ python -m simocollector.benchmarks.collectors
+  $ python -m simocollector.benchmarks.collectors --save-baseline baseline.json
+
+Every call is measured for its latency and for the Python objects it
+retains (objects tracked by the garbage collector and still alive when the
+call returns, the result included, temporary objects are not counted). The
+run fails when a call got slower or retains more objects than the baseline
+(``baseline.json`` next to this module, or ``--baseline``) allows.
+
+"""
+import gc
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import timeit
+
+import simocollector
+from simocollector.benchmarks import median, print_table
+from simocollector.benchmarks.fakeproc import build_fake_proc, disk_name, network_device_name, volume_path
+from simocollector.collectors import SystemCollector, ProcessInfoCollector
+from simocollector.encoding import encode_payload
+from simocollector.procfs import ProcfsBackend, ProcessScanner
+from simocollector.sender import DiskUsageSender, DiskIOSender, NetworkTrafficSender
+from simocollector.state import StateStore
+from simocollector.utils import percentile
+
+
+DEFAULT_SCALES = (10, 1000, 10000)
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_TOLERANCE = 0.5
+
+# Differences of latency below this many milliseconds are noise
+MIN_LATENCY_DIFFERENCE = 0.1
+
+
+def measure(func, repeat):
+    """
+    Return ``{'median_ms': .., 'p95_ms': .., 'retained_objects': ..}`` of
+    ``repeat`` calls of ``func``.
+
+    """
+    # Files are opened and new processes parsed by the first call
+    func()
+
+    times = []
+    objects = []
+    gc.disable()
+    try:
+        for i in range(repeat):
+            gc.collect()
+            # The counter of the youngest generation grows by allocations and
+            # shrinks by deallocations of tracked objects
+            before = gc.get_count()[0]
+            started = timeit.default_timer()
+            result = func()
+            times.append((timeit.default_timer() - started) * 1000)
+            objects.append(gc.get_count()[0] - before)
+            del result
+    finally:
+        gc.enable()
+
+    return {
+        'median_ms': round(median(times), 3),
+        'p95_ms': round(percentile(times, 95), 3),
+        'retained_objects': int(median(objects)),
+    }
+
+
+def build_config(root, work_dir, scale):
+    server_url = 'http://localhost'
+    disk = {}
+    for i in range(scale):
+        # Disk I/O is keyed by the name of the disk, disk usage by its device
+        disk[disk_name(i)] = disk['/dev/' + disk_name(i)] = '{0}/api/disk/{1}/'.format(server_url, i)
+    return {
+        'server': server_url,
+        'server_id': '{0}/api/server/1/'.format(server_url),
+        'username': 'simo',
+        'password': 'simo',
+        'collector_backend': 'procfs',
+        'procfs_root': root,
+        'state_dir': work_dir,
+        'disk': disk,
+        'path_list': [volume_path(root, i) for i in range(scale)],
+        'networkdevices': dict((network_device_name(i), '{0}/api/network-device/{1}/'.format(server_url, i))
+                               for i in range(scale)),
+    }
+
+
+def get_cases(root, config):
+    """
+    Return list of ``(name, callable)`` of the measured calls.
+
+    """
+    collector = SystemCollector(ProcfsBackend(root))
+    state = StateStore()
+    process_collector = ProcessInfoCollector(ProcessScanner(root))
+    disk_usage = DiskUsageSender(config)
+    disk_io = DiskIOSender(config)
+    network_traffic = NetworkTrafficSender(config)
+    disk_io_data = disk_io.get_data()
+    network_traffic_data = network_traffic.get_data()
+    for sender in (disk_usage, disk_io, network_traffic):
+        if not sender.get_data():
+            raise Exception('Sender {0} has no data to benchmark.'.format(sender.name))
+
+    return [
+        ('collector.disk_io', lambda: collector.get_disk_io(state)),
+        ('collector.network_traffic', lambda: collector.get_network_traffic(state)),
+        ('collector.cpu_utilization', lambda: collector.get_cpu_utilization(state)),
+        ('collector.memory_info', collector.get_memory_info),
+        ('collector.disk_usage', lambda: collector.get_disk_usage(config['path_list'])),
+        ('collector.process_list', process_collector.process_list),
+        ('collector.top_processes', process_collector.get_top_processes),
+        ('diskusage.get_data', disk_usage.get_data),
+        ('diskio.get_data', disk_io.get_data),
+        ('networktraffic.get_data', network_traffic.get_data),
+        ('diskio.encode', lambda: encode_payload(disk_io_data, *disk_io.get_payload_encoding())),
+        ('networktraffic.encode',
+         lambda: encode_payload(network_traffic_data, *network_traffic.get_payload_encoding())),
+    ]
+
+
+def run(scales=DEFAULT_SCALES, repeat=20):
+    """
+    Return ``{scale: {case: measurement}}``, scales are strings (as in a
+    baseline read from JSON).
+
+    """
+    results = {}
+    for scale in scales:
+        work_dir = tempfile.mkdtemp(prefix='simo-benchmark-')
+        try:
+            root = '{0}/proc'.format(work_dir)
+            build_fake_proc(root, disks=scale, network_devices=scale, processes=scale)
+            config = build_config(root, work_dir, scale)
+            results[str(scale)] = dict((name, measure(func, repeat)) for name, func in get_cases(root, config))
+        finally:
+            shutil.rmtree(work_dir, True)
+    return results
+
+
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Return list of ``(scale, case, metric, baseline value, value)`` worse
+    than the baseline by more than ``tolerance``.
+
+    """
+    regressions = []
+    for scale, cases in sorted(results.iteritems()):
+        for name, result in sorted(cases.iteritems()):
+            expected = baseline.get(scale, {}).get(name)
+            if expected is None:
+                continue
+            if result['median_ms'] > expected['median_ms'] * (1 + tolerance) and \
+                    result['median_ms'] - expected['median_ms'] > MIN_LATENCY_DIFFERENCE:
+                regressions.append((scale, name, 'median_ms', expected['median_ms'], result['median_ms']))
+            metric = 'retained_objects'
+            if metric in expected and result[metric] > expected[metric] * (1 + tolerance):
+                regressions.append((scale, name, metric, expected[metric], result[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SIMO Collector collectors benchmark')
+    parser.add_argument('-s', '--scale', type=int, action='append',
+                        help='number of disks, network devices and processes (default 10, 1000 and 10000)')
+    parser.add_argument('-r', '--repeat', default=20, type=int, help='calls of every case (default 20)')
+    parser.add_argument('-b', '--baseline', default=DEFAULT_BASELINE, type=str,
+                        help='fail on regressions against this baseline file (default the stored baseline)')
+    parser.add_argument('--no-baseline', action='store_true', help='do not compare with a baseline')
+    parser.add_argument('--tolerance', default=DEFAULT_TOLERANCE, type=float,
+                        help='allowed relative regression (default {0})'.format(DEFAULT_TOLERANCE))
+    parser.add_argument('--save-baseline', type=str, help='save results as the baseline to this file')
+    args = parser.parse_args()
+
+    results = run(args.scale or DEFAULT_SCALES, args.repeat)
+
+    rows = []
+    for scale in sorted(results, key=int):
+        for name in sorted(results[scale]):
+            r = results[scale][name]
+            rows.append([scale, name, '{0:.3f}'.format(r['median_ms']), '{0:.3f}'.format(r['p95_ms']),
+                         r['retained_objects']])
+    print_table(['scale', 'call', 'median ms', 'p95 ms', 'retained objects'], rows)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'version': simocollector.__versionstr__, 'results': results}, f, indent=2, sort_keys=True,
+                      separators=(',', ': '))
+
+    if not args.no_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for scale, name, metric, expected, value in regressions:
+            print('REGRESSION {0} at scale {1}: {2} {3} (baseline {4})'.format(name, scale, metric, value, expected))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
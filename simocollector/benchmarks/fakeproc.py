@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic procfs tree of a host with a given number of disks, network
+devices and processes, readable by ``ProcfsBackend`` and ``ProcessScanner``.
+
+"""
+import os
+import random
+
+
+MEMINFO = """MemTotal:       65785740 kB
+MemFree:        12010812 kB
+MemAvailable:   40120864 kB
+Buffers:          982344 kB
+Cached:         26123784 kB
+SwapCached:            0 kB
+Active:         30812444 kB
+Inactive:       17942072 kB
+SwapTotal:       8388604 kB
+SwapFree:        8123456 kB
+Dirty:               596 kB
+"""
+
+CPUINFO_PROCESSOR = """processor\t: {0}
+vendor_id\t: GenuineIntel
+model name\t: Intel(R) Xeon(R) CPU E5-2680 v4 @ 2.40GHz
+cpu MHz\t\t: 2400.000
+cache size\t: 35840 KB
+
+"""
+
+
+def disk_name(index):
+    return 'dm-{0}'.format(index)
+
+
+def network_device_name(index):
+    return 'veth{0:x}'.format(index)
+
+
+def volume_path(root, index):
+    """
+    Mount point of disk ``index``, an existing directory next to ``root``.
+
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(root)), 'mnt', 'volume{0}'.format(index))
+
+
+def _write(root, name, contents):
+    path = os.path.join(root, name)
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        f.write(contents)
+
+
+def build_fake_proc(root, disks=10, network_devices=10, processes=10, cpus=8, seed=0):
+    """
+    Write procfs files of the host to ``root``. Counters are random, but the
+    same for the same ``seed``.
+
+    """
+    rand = random.Random(seed)
+    uptime = 864000.0
+
+    cpu_times = [rand.randint(10 ** 6, 10 ** 8) for i in range(10)]
+    stat = 'cpu  {0}\n'.format(' '.join(map(str, cpu_times)))
+    for cpu in range(cpus):
+        stat += 'cpu{0} {1}\n'.format(cpu, ' '.join(str(value / cpus) for value in cpu_times))
+    stat += 'ctxt 123456789\nbtime 1400000000\nprocesses {0}\n'.format(processes)
+    _write(root, 'stat', stat)
+
+    _write(root, 'meminfo', MEMINFO)
+    _write(root, 'cpuinfo', ''.join(CPUINFO_PROCESSOR.format(cpu) for cpu in range(cpus)))
+    _write(root, 'uptime', '{0:.2f} {1:.2f}\n'.format(uptime, uptime * cpus * 0.9))
+    _write(root, 'loadavg', '0.52 0.58 0.59 1/{0} 12345\n'.format(processes))
+
+    partitions = ['major minor  #blocks  name', '']
+    diskstats = []
+    for index in range(disks):
+        name = disk_name(index)
+        partitions.append(' 253 {0:>7} {1:>10} {2}'.format(index, rand.randint(10 ** 6, 10 ** 9), name))
+        counters = [rand.randint(0, 10 ** 9) for i in range(11)]
+        diskstats.append(' 253 {0:>7} {1} {2}'.format(index, name, ' '.join(map(str, counters))))
+    _write(root, 'partitions', '\n'.join(partitions) + '\n')
+    _write(root, 'diskstats', '\n'.join(diskstats) + '\n')
+
+    net_dev = [
+        'Inter-|   Receive                                                |  Transmit',
+        ' face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls '
+        'carrier compressed',
+    ]
+    for index in range(network_devices):
+        counters = [rand.randint(0, 10 ** 12) for i in range(16)]
+        net_dev.append('{0:>6}: {1}'.format(network_device_name(index), ' '.join(map(str, counters))))
+    _write(root, 'net/dev', '\n'.join(net_dev) + '\n')
+
+    # Every disk is mounted, among mounts of containers as on container hosts
+    mountinfo = ['21 1 253:0 / / rw,relatime shared:1 - ext4 /dev/vda1 rw']
+    for index in range(disks):
+        mount_id = 100 + index * 3
+        path = volume_path(root, index)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        mountinfo.append('{0} 21 253:{1} / {2} rw,relatime shared:{0} - ext4 /dev/{3} rw'.format(
+            mount_id, index, path, disk_name(index)))
+        mountinfo.append('{0} 21 0:{1} / /var/lib/docker/overlay2/{2:032x}/merged rw,relatime - overlay overlay '
+                         'rw,lowerdir=/var/lib/docker/l/{1}'.format(mount_id + 1, index, rand.getrandbits(128)))
+        mountinfo.append('{0} {1} 0:{2} / /var/lib/docker/containers/{2}/mounts/shm rw,nosuid,nodev - tmpfs shm '
+                         'rw,size=65536k'.format(mount_id + 2, mount_id + 1, index))
+    _write(root, 'self/mountinfo', '\n'.join(mountinfo) + '\n')
+
+    for pid in range(1, processes + 1):
+        # Every tenth process is a kernel thread
+        flags = 0x00200040 if pid % 10 == 0 else 0x00400100
+        start_time = rand.randint(0, int(uptime * 100))
+        fields = ['S', 1, pid, pid, 0, -1, flags, 1000, 0, 10, 0, rand.randint(0, 10 ** 6),
+                  rand.randint(0, 10 ** 5), 0, 0, 20, 0, 1, 0, start_time, 123456789, 2345]
+        _write(root, '{0}/stat'.format(pid),
+               '{0} (worker {0}) {1}\n'.format(pid, ' '.join(map(str, fields))))
+        _write(root, '{0}/statm'.format(pid),
+               '{0} {1} 1024 256 0 4096 0\n'.format(rand.randint(10 ** 4, 10 ** 6), rand.randint(100, 10 ** 5)))
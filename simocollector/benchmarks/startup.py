@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Cold-start benchmark: time to import, build the sender and send the first
+payload of every collection type, each measured in a fresh interpreter::
+
+  $ python -m simocollector.benchmarks.startup --repeat 5 --output startup.json
+
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import simocollector
+from simocollector.benchmarks import build_config, write_config, median, print_table
+from simocollector.mockserver import MockSimoServer
+from simocollector.sender import ALLOWED_SEND_METHOD
+
+
+CHILD_CODE = """
+import sys, json, time
+started = time.time()
+from simocollector.sender import build_sender
+imported = time.time()
+sender = build_sender(sys.argv[1], json.load(open(sys.argv[2])))
+built = time.time()
+sender.send()
+sent = time.time()
+print(json.dumps({'import': imported - started, 'build': built - imported, 'send': sent - built}))
+"""
+
+
+def measure(name, config_path, env):
+    started = time.time()
+    output = subprocess.Popen([sys.executable, '-c', CHILD_CODE, name, config_path],
+                              stdout=subprocess.PIPE, env=env, close_fds=True).communicate()[0]
+    total = time.time() - started
+    result = json.loads(output.strip().splitlines()[-1])
+    result['total'] = total
+    return result
+
+
+def run(types=ALLOWED_SEND_METHOD, repeat=5):
+    """
+    Return ``{type: {'total': .., 'import': .., 'build': .., 'send': ..}}``
+    of median times in seconds.
+
+    """
+    work_dir = tempfile.mkdtemp(prefix='simo-benchmark-')
+    server = MockSimoServer().start()
+    try:
+        config_path = write_config(build_config(server.url, work_dir), work_dir)
+        env = dict(os.environ)
+        package_path = os.path.dirname(os.path.dirname(os.path.abspath(simocollector.__file__)))
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [package_path, env.get('PYTHONPATH')]))
+
+        results = {}
+        for name in types:
+            runs = [measure(name, config_path, env) for i in range(repeat)]
+            results[name] = dict((key, median([r[key] for r in runs])) for key in runs[0])
+        return results
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SIMO Collector cold-start benchmark')
+    parser.add_argument('-t', '--type', choices=ALLOWED_SEND_METHOD, action='append',
+                        help='type of collection (default all)')
+    parser.add_argument('-r', '--repeat', default=5, type=int, help='runs of every type (default 5)')
+    parser.add_argument('-o', '--output', type=str, help='append results as a JSON line to this file')
+    args = parser.parse_args()
+
+    results = run(args.type or ALLOWED_SEND_METHOD, args.repeat)
+
+    rows = []
+    for name in sorted(results):
+        r = results[name]
+        rows.append([name] + ['{0:.1f}'.format(r[key] * 1000) for key in ('total', 'import', 'build', 'send')])
+    print_table(['type', 'total ms', 'import ms', 'build ms', 'first send ms'], rows)
+
+    if args.output:
+        with open(args.output, 'a') as f:
+            f.write(json.dumps({'version': simocollector.__versionstr__, 'time': time.time(),
+                                'results': results}) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput benchmark of the sender path: senders built by ``build_sender``
+send in a loop from several threads to the mock SIMO server, which runs in
+its own process and may inject latency, errors and throttling::
+
+  $ python -m simocollector.benchmarks.throughput --duration 10 --concurrency 4
+  $ python -m simocollector.benchmarks.throughput --scale 1000 --bulk-upload --latency 0.05 --rate-limit 50
+
+Reported are samples (sent objects) and payloads per second, latency
+percentiles of the sends and CPU time of this process per payload, which
+includes collecting, encoding and the HTTP requests, but not the server.
+
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import urllib2
+import argparse
+import tempfile
+import threading
+import subprocess
+import timeit
+
+import simocollector
+from simocollector.backoff import RetryBudget
+from simocollector.benchmarks import build_config, print_table
+from simocollector.encoding import ENCODINGS, COMPRESSIONS
+from simocollector.sender import DEFAULT_SEND_METHOD, ALLOWED_SEND_METHOD, build_sender
+from simocollector.stats import stats
+from simocollector.utils import percentile
+
+
+DEFAULT_DURATION = 10
+DEFAULT_CONCURRENCY = 4
+
+
+def start_server(options):
+    """
+    Start the mock SIMO server with command line ``options`` in a new
+    process, return ``(process, url)``.
+
+    """
+    package_path = os.path.dirname(os.path.dirname(os.path.abspath(simocollector.__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [package_path, env.get('PYTHONPATH')]))
+    process = subprocess.Popen([sys.executable, '-m', 'simocollector.mockserver', '--port', '0', '--quiet',
+                                '--discard'] + options, stdout=subprocess.PIPE, env=env, close_fds=True)
+    line = process.stdout.readline()
+    if not line:
+        process.wait()
+        raise Exception('Mock SIMO server did not start.')
+    return process, line.split()[-1]
+
+
+def build_scaled_config(server_url, work_dir, scale):
+    """
+    Configuration of a host with ``scale`` disks, network devices and
+    processes in a synthetic procfs tree.
+
+    """
+    from simocollector.benchmarks import collectors
+    from simocollector.benchmarks.fakeproc import build_fake_proc
+
+    root = os.path.join(work_dir, 'proc')
+    build_fake_proc(root, disks=scale, network_devices=scale, processes=scale)
+    config = collectors.build_config(root, work_dir, scale)
+    config['server'] = server_url
+    config['spool_dir'] = os.path.join(work_dir, 'spool')
+    return config
+
+
+def _describe_error(e):
+    if isinstance(e, urllib2.HTTPError):
+        return 'HTTP {0}'.format(e.code)
+    return type(e).__name__
+
+
+def run_worker(config, types, deadline, result):
+    """
+    Send collections of ``types`` in turn until ``deadline``, collect
+    ``{type: {'latencies': [..], 'samples': .., 'errors': {..}}}`` in
+    ``result``.
+
+    """
+    senders = [build_sender(name, config) for name in types]
+    for sender in senders:
+        result[sender.name] = {'latencies': [], 'samples': 0, 'errors': {}}
+
+    while time.time() < deadline:
+        for sender in senders:
+            # Every send is a cycle of its own, as a one-shot run is
+            sender.retry_budget = RetryBudget.from_config(config)
+            values = result[sender.name]
+            started = timeit.default_timer()
+            try:
+                sender.send()
+            except Exception, e:
+                error = _describe_error(e)
+                values['errors'][error] = values['errors'].get(error, 0) + 1
+            else:
+                data = sender.last_data
+                values['samples'] += len(data) if isinstance(data, list) else 1
+            values['latencies'].append((timeit.default_timer() - started) * 1000)
+
+
+def summarize(name, workers, counters, elapsed, cpu):
+    latencies = []
+    samples = 0
+    errors = {}
+    for result in workers:
+        values = result.get(name)
+        if values is None:
+            continue
+        latencies.extend(values['latencies'])
+        samples += values['samples']
+        for error, count in values['errors'].iteritems():
+            errors[error] = errors.get(error, 0) + count
+
+    payloads = counters.get('sender.{0}.payloads'.format(name), 0)
+    return {
+        'sends': len(latencies),
+        'samples_per_sec': round(samples / elapsed, 1),
+        'payloads_per_sec': round(payloads / elapsed, 1),
+        'kb_per_sec': round(counters.get('sender.{0}.bytes'.format(name), 0) / 1024.0 / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'retries': counters.get('sender.{0}.retries'.format(name), 0),
+        'errors': errors,
+        'payloads': payloads,
+        'cpu_ms': cpu,
+    }
+
+
+def run(types=DEFAULT_SEND_METHOD, duration=DEFAULT_DURATION, concurrency=DEFAULT_CONCURRENCY, scale=None,
+        server_options=(), config_options=None):
+    """
+    Return ``{type: measurement}`` and the ``total`` of all types.
+
+    """
+    work_dir = tempfile.mkdtemp(prefix='simo-benchmark-')
+    process, server_url = start_server(list(server_options))
+    try:
+        if scale:
+            config = build_scaled_config(server_url, work_dir, scale)
+        else:
+            config = build_config(server_url, work_dir)
+        config['stats_file'] = None
+        config.update(config_options or {})
+
+        # Senders are warmed up (imports, connections, first collection) before measuring
+        for name in types:
+            sender = build_sender(name, dict(config, state_dir=os.path.join(work_dir, 'warmup')))
+            if not sender.get_data():
+                raise Exception('Sender {0} has no data to benchmark.'.format(name))
+            try:
+                sender.send()
+            except Exception:
+                pass
+
+        workers = [{} for i in range(concurrency)]
+        threads = []
+        stats.snapshot(reset=True)
+        started = time.time()
+        cpu_started = sum(os.times()[:2])
+        for index, result in enumerate(workers):
+            # Own state for every worker, the state files are not shared between processes either
+            worker_config = dict(config, state_dir=os.path.join(work_dir, 'state-{0}'.format(index)))
+            thread = threading.Thread(target=run_worker, args=(worker_config, types, started + duration, result))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - started
+        cpu = (sum(os.times()[:2]) - cpu_started) * 1000
+        counters = stats.snapshot(reset=True)['counters']
+    finally:
+        process.terminate()
+        process.wait()
+        shutil.rmtree(work_dir, True)
+
+    results = {}
+    total_payloads = sum(counters.get('sender.{0}.payloads'.format(name), 0) for name in types)
+    for name in types:
+        results[name] = summarize(name, workers, counters, elapsed, cpu)
+    total = {'samples_per_sec': 0.0, 'payloads_per_sec': 0.0, 'kb_per_sec': 0.0, 'sends': 0, 'retries': 0,
+             'cpu_ms_per_payload': round(cpu / total_payloads, 3) if total_payloads else None}
+    for name in types:
+        for key in ('samples_per_sec', 'payloads_per_sec', 'kb_per_sec', 'sends', 'retries'):
+            total[key] += results[name][key]
+        # CPU time is shared by the types, it is reported for all of them only
+        del results[name]['cpu_ms']
+    results['total'] = total
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SIMO Collector sender throughput benchmark')
+    parser.add_argument('-t', '--type', choices=ALLOWED_SEND_METHOD, action='append',
+                        help='type of collection (default the types sent by default)')
+    parser.add_argument('-d', '--duration', default=DEFAULT_DURATION, type=float,
+                        help='seconds of sending (default {0})'.format(DEFAULT_DURATION))
+    parser.add_argument('-c', '--concurrency', default=DEFAULT_CONCURRENCY, type=int,
+                        help='sending threads (default {0})'.format(DEFAULT_CONCURRENCY))
+    parser.add_argument('-s', '--scale', type=int,
+                        help='number of disks, network devices and processes of a synthetic host '
+                             '(default the local host)')
+    parser.add_argument('--bulk-upload', action='store_true', help='send multi-object collections in bulk')
+    parser.add_argument('--encoding', choices=ENCODINGS, help='payload encoding')
+    parser.add_argument('--compression', choices=[c for c in COMPRESSIONS if c], help='payload compression')
+    parser.add_argument('--latency', type=float, help='seconds the server waits before every response')
+    parser.add_argument('--error-rate', type=float, help='fraction of requests the server fails with 500')
+    parser.add_argument('--rate-limit', type=float, help='requests per second the server accepts, 429 over it')
+    parser.add_argument('--retry-after', type=int, help='Retry-After of throttled requests')
+    parser.add_argument('-o', '--output', type=str, help='append results as a JSON line to this file')
+    args = parser.parse_args()
+
+    server_options = []
+    for option in ('latency', 'error_rate', 'rate_limit', 'retry_after'):
+        value = getattr(args, option)
+        if value is not None:
+            server_options.extend(['--{0}'.format(option.replace('_', '-')), str(value)])
+
+    config_options = {}
+    if args.bulk_upload:
+        config_options['bulk_upload'] = True
+    if args.encoding:
+        config_options['payload_encoding'] = args.encoding
+    if args.compression:
+        config_options['payload_compression'] = args.compression
+
+    types = args.type or DEFAULT_SEND_METHOD
+    results = run(types, args.duration, args.concurrency, args.scale, server_options, config_options)
+
+    rows = []
+    for name in types:
+        r = results[name]
+        errors = ', '.join('{0} x{1}'.format(error, count) for error, count in sorted(r['errors'].iteritems()))
+        rows.append([name, r['sends'], r['samples_per_sec'], r['payloads_per_sec'], r['kb_per_sec'],
+                     r['p50_ms'], r['p95_ms'], r['p99_ms'], r['retries'], errors or '-'])
+    print_table(['type', 'sends', 'samples/s', 'payloads/s', 'KB/s', 'p50 ms', 'p95 ms', 'p99 ms', 'retries',
+                 'errors'], rows)
+
+    total = results['total']
+    print('\nTotal {0} samples/s, {1} payloads/s, {2} KB/s, {3} ms CPU per payload'.format(
+        total['samples_per_sec'], total['payloads_per_sec'], total['kb_per_sec'], total['cpu_ms_per_payload']))
+
+    if args.output:
+        with open(args.output, 'a') as f:
+            f.write(json.dumps({'version': simocollector.__versionstr__, 'time': time.time(),
+                                'options': vars(args), 'results': results}) + '\n')
+
+
+if __name__ == '__main__':
+    main()
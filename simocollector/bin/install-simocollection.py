@@ -10,7 +10,9 @@ import psutil
 
 from simocollector.sender import BaseObjectSender, BaseMultiObjectSender
 from simocollector.collectors import system_info_collector
-from simocollector.utils import slugify
+from simocollector.dispatch import Dispatcher
+from simocollector.state import get_state_store
+from simocollector.utils import slugify, get_network_interfaces
 
 
 CRON_JOB_FILENAME = '/etc/cron.d/simo-collector'
@@ -19,6 +21,7 @@ CONFIG_FILE_DEFAULT_PATH = '/etc/simo/collector.conf'
 
 class ServerInfoSender(BaseObjectSender):
     name = 'server'
+    use_spool = False
 
     def __init__(self, config, ip, name):
         if 'server_id' not in config:
@@ -28,7 +31,7 @@ class ServerInfoSender(BaseObjectSender):
         self.server_name = slugify(unicode(name))
 
     def get_data(self):
-        raw_data = system_info_collector.get_system_info()
+        raw_data = system_info_collector.get_system_info(get_state_store(self.config))
         data = {
             'distribution': raw_data['distro'].get('distribution', 'unknown'),
             'release': raw_data['distro'].get('release', 'unknown'),
@@ -44,31 +47,46 @@ class ServerInfoSender(BaseObjectSender):
         return data
 
 
-class DiskRegisterSender(BaseObjectSender):
+class DiskRegisterSender(BaseMultiObjectSender):
     name = 'disk'
-    data = {}
+    use_spool = False
+    bulk_upload = True
+
+    def __init__(self, config, partitions):
+        super(DiskRegisterSender, self).__init__(config)
+        self.partitions = partitions
 
     def get_data(self):
-        return self.data
-
-    def set_partition(self, partiton):
-        usage = psutil.disk_usage(partiton.mountpoint)
-        total = int(usage.total) / (1024 * 1024)  # Convert to MB
-        self.data = {
-            'partition_name': partiton.device.replace('/dev/', ''),
-            'path': partiton.mountpoint,
-            'total': total,
-            'volume': partiton.device,
-        }
+        data = []
+        for partition in self.partitions:
+            usage = psutil.disk_usage(partition.mountpoint)
+            total = int(usage.total) / (1024 * 1024)  # Convert to MB
+            partition_data = {
+                'partition_name': partition.device.replace('/dev/', ''),
+                'path': partition.mountpoint,
+                'total': total,
+                'volume': partition.device,
+            }
+            data.append(self.add_additional_data(partition_data))
+
+        return data
 
 
 class NetDeviceRegisterSender(BaseMultiObjectSender):
     name = 'netdevice'
+    use_spool = False
+    bulk_upload = True
+
+    def __init__(self, config, devices=None):
+        super(NetDeviceRegisterSender, self).__init__(config)
+        self.devices = devices
 
     def get_data(self):
         raw_data = system_info_collector.get_network_traffic()
         data = []
         for device_name in raw_data.iterkeys():
+            if self.devices is not None and device_name not in self.devices:
+                continue
             device_data = {
                 'name': device_name,
             }
@@ -78,16 +96,55 @@ class NetDeviceRegisterSender(BaseMultiObjectSender):
 
 
 def _get_hostname():
-    return subprocess.Popen(['hostname'], stdout=subprocess.PIPE, close_fds=True).communicate()[0].strip()
+    return socket.gethostname()
 
 
-def _get_host_ip_address():
+def _get_interface_address(interface):
+    import fcntl
+    import struct
+
+    SIOCGIFADDR = 0x8915
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    s.connect(('google.com', 80))
-    ip = s.getsockname()[0]
-    s.close()
+    try:
+        request = struct.pack('256s', interface[:15])
+        return socket.inet_ntoa(fcntl.ioctl(s.fileno(), SIOCGIFADDR, request)[20:24])
+    except IOError:
+        # Interface has no IPv4 address
+        return None
+    finally:
+        s.close()
+
 
-    return ip
+def _get_default_route_interface():
+    try:
+        with open('/proc/net/route', 'r') as f:
+            for line in f.readlines()[1:]:
+                fields = line.split()
+                if fields[1] == '00000000':
+                    return fields[0]
+    except EnvironmentError:
+        pass
+    return None
+
+
+def _get_host_ip_address():
+    """
+    Address of the interface of the default route, or of the first interface
+    with an address. Only local interfaces are looked at, so it works offline.
+
+    """
+    interfaces = get_network_interfaces() or []
+    default_interface = _get_default_route_interface()
+    if default_interface in interfaces:
+        interfaces.remove(default_interface)
+        interfaces.insert(0, default_interface)
+
+    for interface in interfaces:
+        address = _get_interface_address(interface)
+        if address is not None:
+            return address
+
+    return '127.0.0.1'
 
 
 def create_cron_jobs():
@@ -96,10 +153,10 @@ def create_cron_jobs():
     jobs = [
         '*/2 * * * * root {0} -t loadavg'.format(publisher_path),
         '*/6 * * * * root {0} -t networktraffic'.format(publisher_path),
-        '*/5 * * * * root sleep 20 && {0} -t cpu'.format(publisher_path),
+        '*/5 * * * * root {0} -t cpu'.format(publisher_path),
         '*/9 * * * * root {0} -t memory'.format(publisher_path),
         '1 */3 * * * root {0} -t diskusage'.format(publisher_path),
-        '1 3 * * * root {0} -t diskio'.format(publisher_path),
+        '*/10 * * * * root {0} -t diskio'.format(publisher_path),
     ]
 
     if not os.path.exists(os.path.dirname(CRON_JOB_FILENAME)):
@@ -129,7 +186,11 @@ cyan = _wrap_with('36')
 white = _wrap_with('37')
 
 
-def build_partition_list_for_registration():
+def build_partition_list_for_registration(mountpoints=None):
+    """
+    Partitions chosen interactively, or the ones mounted at ``mountpoints``.
+
+    """
     str_bool_values = ('y', 'yes', 'true', 't', '1')
 
     def str2bool(v):
@@ -137,6 +198,13 @@ def build_partition_list_for_registration():
 
     partition_list = psutil.disk_partitions(all=True)
 
+    if mountpoints is not None:
+        partitions = dict((partition.mountpoint, partition) for partition in partition_list)
+        missing = [mountpoint for mountpoint in mountpoints if mountpoint not in partitions]
+        if missing:
+            raise Exception('Partitions {0} are not mounted.'.format(', '.join(missing)))
+        return [partitions[mountpoint] for mountpoint in mountpoints]
+
     partition_list_to_register = []
     for partition in partition_list:
         result = raw_input(
@@ -147,6 +215,51 @@ def build_partition_list_for_registration():
     return partition_list_to_register
 
 
+def read_answers(path):
+    """
+    Answers of the installer from a JSON file with ``server``, ``username``,
+    ``password`` and optionally ``ip_address``, ``name``, ``partitions``
+    (mount points) and ``networkdevices`` (names).
+
+    """
+    with open(path, 'r') as f:
+        answers = json.load(f)
+
+    for name in ('server', 'username', 'password'):
+        if name not in answers:
+            raise Exception('Missing parameter "{0}" in selection file.'.format(name))
+
+    answers.setdefault('ip_address', _get_host_ip_address())
+    answers.setdefault('name', _get_hostname())
+    answers.setdefault('partitions', [])
+    answers.setdefault('networkdevices', None)
+    return answers
+
+
+def ask_answers():
+    actual_user = getpass.getuser()
+    host_ip_address = _get_host_ip_address()
+    current_hostname = _get_hostname()
+
+    answers = {}
+    answers['username'] = raw_input('Username [{0}]: '.format(actual_user)) or actual_user
+    answers['password'] = getpass.getpass('Password: ')
+    answers['server'] = raw_input('SIMO url: ')
+    answers['ip_address'] = raw_input('Write server ip address [{0}]: '.format(host_ip_address)) or host_ip_address
+    answers['name'] = raw_input('Server name [{0}]: '.format(current_hostname)) or current_hostname
+    answers['partitions'] = None
+    answers['networkdevices'] = None
+    return answers
+
+
+def _print_registration_error(e):
+    print(red('Problem in registration process'))
+    if isinstance(e, urllib2.HTTPError):
+        _write_error(e.fp.read())
+    else:
+        print(e)
+
+
 def _write_error(data):
     import tempfile
 
@@ -162,30 +275,28 @@ def main():
     parser = argparse.ArgumentParser(description='SIMO Collector installer.')
     parser.add_argument('path', default=CONFIG_FILE_DEFAULT_PATH, type=str, nargs='?',
                         help='path to configuration file (default {0}).'.format(CONFIG_FILE_DEFAULT_PATH))
+    parser.add_argument('-s', '--selection', type=str,
+                        help='install non-interactively with answers, partitions and network devices '
+                             'from this JSON file')
 
     args = parser.parse_args()
 
-    actual_user = getpass.getuser()
-    host_ip_address = _get_host_ip_address()
-    current_hostname = _get_hostname()
-
-    username = raw_input('Username [{0}]: '.format(actual_user)) or actual_user
-    password = getpass.getpass('Password: ')
-    server = raw_input('SIMO url: ')
-    ip_address = raw_input('Write server ip address [{0}]: '.format(host_ip_address)) or host_ip_address
-    hostname = raw_input('Server name [{0}]: '.format(current_hostname)) or current_hostname
+    if args.selection:
+        answers = read_answers(args.selection)
+    else:
+        answers = ask_answers()
 
     config = {
-        'username': username,
-        'password': password,
-        'server': server
+        'username': answers['username'],
+        'password': answers['password'],
+        'server': answers['server'],
     }
 
     print('\n\n')
 
     response_data = {}
     try:
-        sender = ServerInfoSender(config, ip_address, hostname)
+        sender = ServerInfoSender(config, answers['ip_address'], answers['name'])
         response = sender.send()
         response_data = json.loads(response)
     except urllib2.HTTPError, e:
@@ -199,26 +310,24 @@ def main():
         exit(1)
 
     config['server_id'] = response_data['url']
-    config['server'] = server
-    config['username'] = username
-    config['password'] = password
 
     config_path = args.path
     if not os.path.exists(os.path.dirname(config_path)):
         os.makedirs(os.path.dirname(config_path))
 
-    response_list = []
-    partition_list_for_registration = build_partition_list_for_registration()
-    for partition in partition_list_for_registration:
-        try:
-            r_sender = DiskRegisterSender(config)
-            r_sender.set_partition(partition)
-            response_list.append(r_sender.send())
-        except urllib2.HTTPError, e:
-            print(red('Problem in disk registration process'))
-            error_log = e.fp.read()
-            _write_error(error_log)
+    partitions = build_partition_list_for_registration(answers['partitions'])
+
+    # Disks and network devices are registered concurrently, each in one bulk request if possible
+    dispatcher = Dispatcher.from_config(config)
+    results = dispatcher.dispatch([DiskRegisterSender(config, partitions),
+                                   NetDeviceRegisterSender(config, answers['networkdevices'])])
+    dispatcher.close()
+
+    for sender, response, exc_info in results:
+        if exc_info is not None:
+            _print_registration_error(exc_info[1])
             exit(1)
+    response_list, response = results[0][1], results[1][1]
 
     config['disk'] = {}
     config['path_list'] = []
@@ -229,15 +338,6 @@ def main():
         config['disk'][partition_name] = disk['url']
         config['path_list'].append(disk['path'])
 
-    response = {}
-    try:
-        response = NetDeviceRegisterSender(config).send()
-    except urllib2.HTTPError, e:
-        print(red('Problem in disk registration process'))
-        error_log = e.fp.read()
-        _write_error(error_log)
-        exit(1)
-
     config['networkdevices'] = {}
     for data in response:
         device_data = json.loads(data)
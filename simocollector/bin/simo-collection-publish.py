@@ -3,9 +3,12 @@ import sys
 import os
 import argparse
 import json
+import signal
+import time
 from urllib2 import HTTPError
 
-from simocollector.sender import ALLOWED_SEND_METHOD, build_sender
+from simocollector.sender import DEFAULT_SEND_METHOD, ALLOWED_SEND_METHOD, build_sender
+from simocollector.stats import flush_stats
 
 
 def parse_config_file(path):
@@ -15,6 +18,125 @@ def parse_config_file(path):
     return data
 
 
+def _print_http_error(e):
+    if hasattr(e, 'fp'):
+        print(e.fp.read())
+    else:
+        print(e)
+
+
+def _print_error(name, e):
+    print('Collection {0} failed:'.format(name))
+    if isinstance(e, HTTPError):
+        _print_http_error(e)
+    else:
+        print(e)
+
+
+def run_concurrently(config, types, output=False):
+    from simocollector.backoff import RetryBudget
+    from simocollector.dispatch import Dispatcher
+
+    senders = [build_sender(name, config) for name in types]
+    budget = RetryBudget.from_config(config)
+    for sender in senders:
+        sender.retry_budget = budget
+
+    dispatcher = Dispatcher.from_config(config)
+    results = dispatcher.dispatch(senders)
+    dispatcher.close()
+
+    delivered = None
+    for sender, response, exc_info in results:
+        if exc_info is None:
+            delivered = sender
+            if output:
+                import pprint
+                pprint.pprint(response)
+        elif output:
+            _print_error(sender.name, exc_info[1])
+
+    if delivered is not None:
+        # Server is reachable again, deliver what was spooled while it was not
+        replayed = delivered.replay_spool()
+        if output and replayed:
+            print('Replayed {0} spooled payloads'.format(replayed))
+
+
+def run_once(config, types, output=False):
+    if len(types) > 1:
+        run_concurrently(config, types, output)
+        return
+
+    try:
+        sender = build_sender(types[0], config)
+        response = sender.send()
+        if output:
+            import pprint
+            pprint.pprint(response)
+        # Server is reachable again, deliver what was spooled while it was not
+        replayed = sender.replay_spool()
+        if output and replayed:
+            print('Replayed {0} spooled payloads'.format(replayed))
+    except HTTPError, e:
+        if output:
+            if hasattr(e, 'fp'):
+                print(e.fp.read())
+            else:
+                raise e
+
+
+def wait_for_jitter(config, types):
+    # Hosts running the same cron jobs post at different seconds, well before the next run
+    from simocollector.backoff import get_one_shot_jitter
+
+    time.sleep(get_one_shot_jitter(config, types))
+
+
+def run_daemon(config, types, output=False):
+    from simocollector.daemon import Daemon
+
+    def on_response(job, response):
+        if output:
+            import pprint
+            pprint.pprint(response)
+
+    def on_error(job, e):
+        if output:
+            _print_error(job.name, e)
+
+    daemon = Daemon(config, types, on_response=on_response, on_error=on_error)
+
+    def stop(signum, frame):
+        daemon.stop()
+    signal.signal(signal.SIGTERM, stop)
+
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def run_relay(config, address, output=False):
+    from simocollector.relay import DEFAULT_RELAY_PORT, Relay
+
+    def on_error(name, e):
+        if output:
+            _print_error(name, e)
+
+    host, _, port = address.rpartition(':')
+    relay = Relay(config, host or '0.0.0.0', int(port or DEFAULT_RELAY_PORT), on_error=on_error, verbose=output)
+
+    def stop(signum, frame):
+        relay.stop()
+    signal.signal(signal.SIGTERM, stop)
+
+    try:
+        relay.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+
 def main():
     str_bool_values = ('y', 'yes', 'true', 't', '1')
 
@@ -22,12 +144,22 @@ def main():
         return v.lower() in str_bool_values
 
     parser = argparse.ArgumentParser(description='SIMO collector')
-    parser.add_argument('-t', '--type', choices=ALLOWED_SEND_METHOD, type=str, required=True,
-                        help='type of collection')
+    parser.add_argument('-t', '--type', choices=ALLOWED_SEND_METHOD, type=str, action='append',
+                        help='type of collection, several types are sent concurrently')
+
+    parser.add_argument('-d', '--daemon', action='store_true',
+                        help='run every type of collection (or the given ones) on its own interval '
+                             'in one long-running process')
+
+    parser.add_argument('-r', '--relay', metavar='[HOST:]PORT', type=str,
+                        help='relay collections posted by other collectors to the server of the configuration')
 
     parser.add_argument('-c', '--config', default='/etc/simo/collector.conf', type=str,
                         help='path to configuration file (default /etc/simo/collector.conf).')
 
+    parser.add_argument('--no-jitter', dest='jitter', action='store_false',
+                        help='send at once instead of after the offset of this host')
+
     parser.add_argument('-o', '--output', default=False, type=bool,
                         help='render output? ({0})'.format(', '.join(str_bool_values)))
     parser.register('type', 'bool', str2bool)
@@ -38,6 +170,9 @@ def main():
 
     args = parser.parse_args()
 
+    if not args.type and not args.daemon and not args.relay:
+        parser.error('one of the arguments -t/--type -d/--daemon -r/--relay is required')
+
     def strip(text):
         if text:
             return text.strip('"').strip("'")
@@ -48,17 +183,23 @@ def main():
         sys.exit(1)
 
     config = parse_config_file(config_path)
+    types = [strip(name) for name in args.type or ()]
+
+    if args.relay:
+        run_relay(config, args.relay, args.output)
+        return
+
+    if args.daemon:
+        run_daemon(config, types or DEFAULT_SEND_METHOD, args.output)
+        return
+
+    if args.jitter:
+        wait_for_jitter(config, types)
+
     try:
-        response = build_sender(strip(args.type), config).send()
-        if args.output:
-            import pprint
-            pprint.pprint(response)
-    except HTTPError, e:
-        if args.output:
-            if hasattr(e, 'fp'):
-                print(e.fp.read())
-            else:
-                raise e
+        run_once(config, types, args.output)
+    finally:
+        flush_stats(config)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Scanner of the cgroup v2 hierarchy.
+
+The list of cgroups is kept between scans and walked again only when the
+number of descendants of the root or the modification time of a walked
+directory changes, a listed cgroup disappears, or after ``rescan_every``
+scans. A scan then just reads ``cpu.stat``, ``memory.current`` and
+``io.stat`` of every cgroup.
+
+"""
+__all__ = ['DEFAULT_CGROUP_ROOT', 'DEFAULT_RESCAN_EVERY', 'COUNTERS', 'CgroupScanner']
+
+import os
+from fnmatch import fnmatch
+
+
+DEFAULT_CGROUP_ROOT = '/sys/fs/cgroup'
+
+# Scans between walks of the hierarchy, for changes the other checks miss
+DEFAULT_RESCAN_EVERY = 10
+
+CPU_STAT_FIELDS = {
+    'usage_usec': 'cpu_usage_usec',
+    'user_usec': 'cpu_user_usec',
+    'system_usec': 'cpu_system_usec',
+    'throttled_usec': 'cpu_throttled_usec',
+}
+
+IO_STAT_FIELDS = {
+    'rbytes': 'io_read_bytes',
+    'wbytes': 'io_write_bytes',
+    'rios': 'io_read_ops',
+    'wios': 'io_write_ops',
+}
+
+# Values which are cumulative counters, the others are gauges
+COUNTERS = tuple(CPU_STAT_FIELDS.values()) + tuple(IO_STAT_FIELDS.values())
+
+
+def _read(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except EnvironmentError:
+        # Controller is not enabled in the cgroup, or the cgroup was removed
+        return None
+
+
+class CgroupScanner(object):
+    """
+    Scanner of cgroups under ``root`` whose path relative to it matches
+    one of ``patterns`` (all cgroups without them).
+
+    """
+
+    def __init__(self, root=DEFAULT_CGROUP_ROOT, patterns=None, rescan_every=DEFAULT_RESCAN_EVERY):
+        self.root = root
+        self.patterns = patterns
+        self.rescan_every = rescan_every
+        self._cgroups = None
+        self._descendants = None
+        self._mtimes = None
+        self._scans = 0
+
+    def _count_descendants(self):
+        for line in (_read(os.path.join(self.root, 'cgroup.stat')) or '').splitlines():
+            name, _, value = line.partition(' ')
+            if name == 'nr_descendants':
+                return int(value)
+        return None
+
+    def _walk(self):
+        cgroups = []
+        self._mtimes = {}
+        for directory, subdirectories, files in os.walk(self.root):
+            try:
+                self._mtimes[directory] = os.stat(directory).st_mtime
+            except OSError:
+                # Removed while walking
+                continue
+            if directory == self.root:
+                continue
+            name = os.path.relpath(directory, self.root)
+            if self.patterns and not any(fnmatch(name, pattern) for pattern in self.patterns):
+                continue
+            cgroups.append((name, directory))
+        return cgroups
+
+    def _is_changed(self, descendants):
+        # Same number of descendants may hide a cgroup created and another removed
+        if descendants is None or descendants != self._descendants:
+            return True
+        for directory, mtime in self._mtimes.iteritems():
+            try:
+                if os.stat(directory).st_mtime != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def list_cgroups(self):
+        """
+        Return list of ``(name, path)`` of the cgroups.
+
+        """
+        descendants = self._count_descendants()
+        self._scans += 1
+        if self._cgroups is None or self._scans > self.rescan_every or self._is_changed(descendants):
+            self._cgroups = self._walk()
+            self._descendants = descendants
+            self._scans = 1
+        return self._cgroups
+
+    def scan(self):
+        """
+        Return ``{name: values}`` of the cgroups, see ``COUNTERS``, and
+        ``memory_current`` in bytes.
+
+        """
+        result = {}
+        for name, path in self.list_cgroups():
+            values = {}
+
+            cpu_stat = _read(os.path.join(path, 'cpu.stat'))
+            if cpu_stat is None and not os.path.isdir(path):
+                # Removed in the meantime, list the cgroups again by the next scan
+                self._cgroups = None
+                continue
+
+            for line in (cpu_stat or '').splitlines():
+                field, _, value = line.partition(' ')
+                if field in CPU_STAT_FIELDS:
+                    values[CPU_STAT_FIELDS[field]] = int(value)
+
+            memory_current = _read(os.path.join(path, 'memory.current'))
+            if memory_current is not None:
+                values['memory_current'] = int(memory_current)
+
+            io_stat = _read(os.path.join(path, 'io.stat'))
+            if io_stat is not None:
+                # One line per device, summed up
+                for field in IO_STAT_FIELDS.values():
+                    values[field] = 0
+                for line in io_stat.splitlines():
+                    for item in line.split()[1:]:
+                        field, _, value = item.partition('=')
+                        if field in IO_STAT_FIELDS:
+                            values[IO_STAT_FIELDS[field]] += int(value)
+
+            result[name] = values
+
+        return result
@@ -1,17 +1,100 @@
 import os
-import subprocess
-import re
-import psutil
+import time
+import heapq
 import platform
 
+from simocollector.cgroups import DEFAULT_CGROUP_ROOT, COUNTERS as CGROUP_COUNTERS, CgroupScanner
+from simocollector.procfs import DEFAULT_PROCFS_ROOT, ProcfsBackend, MountTable, ProcessScanner
+from simocollector.records import (Record, MemoryRecord, LoadAverageRecord, CPURecord, DiskUsageRecord,
+                                   DiskIORecord, NetworkTrafficRecord)
+from simocollector.stats import timed
+from simocollector.utils import counter_delta
+
+
+class PsutilBackend(object):
+    """
+    Source of the raw system values for ``SystemCollector``.
+
+    ``ProcfsBackend`` provides the same methods with the same results.
+
+    """
+
+    name = 'psutil'
+
+    # Procfs read by psutil
+    root = DEFAULT_PROCFS_ROOT
+
+    _psutil = None
+
+    @property
+    def psutil(self):
+        # Imported on first use, so that collections which do not need it do not pay for it
+        if self._psutil is None:
+            import psutil
+            self._psutil = psutil
+        return self._psutil
+
+    def num_cpus(self):
+        # Same count as psutil's, without importing it for the load average
+        try:
+            count = os.sysconf('SC_NPROCESSORS_ONLN')
+        except (ValueError, OSError):
+            count = 0
+        return count if count > 0 else self.psutil.NUM_CPUS
+
+    def cpu_times(self):
+        return list(self.psutil.cpu_times())
+
+    def virtual_memory(self):
+        memory_usage = self.psutil.virtual_memory()
+        return memory_usage.total, memory_usage.free, memory_usage.used, memory_usage.percent
+
+    def swap_memory(self):
+        return tuple(self.psutil.swap_memory())[:4]
+
+    def load_average(self):
+        return os.getloadavg()
+
+    def uptime_seconds(self):
+        with open(os.path.join(self.root, 'uptime'), 'r') as f:
+            return float(f.read().split()[0])
+
+    def disk_io_counters(self):
+        return dict((name, dict(counters._asdict()))
+                    for name, counters in self.psutil.disk_io_counters(True).iteritems())
+
+    def net_io_counters(self):
+        return dict((name, (counters.bytes_sent, counters.bytes_recv))
+                    for name, counters in self.psutil.net_io_counters(pernic=True).iteritems())
+
+
+BACKENDS = {
+    'psutil': PsutilBackend,
+    'procfs': ProcfsBackend,
+}
+
+DEFAULT_BACKEND = 'psutil'
+
+# Byte counters of disk I/O and network traffic, sent in KB as these fields
+KB_FIELDS = {
+    'read_bytes': 'read_kb',
+    'write_bytes': 'write_kb',
+    'bytes_received': 'received',
+    'bytes_transmitted': 'transmitted',
+}
+
 
 class SystemCollector(object):
-    def get_uptime(self):
+    def __init__(self, backend=None):
+        self.backend = backend or PsutilBackend()
+        self.mount_table = MountTable(os.path.join(self.backend.root, 'self', 'mountinfo'))
 
-        with open('/proc/uptime', 'r') as line:
-            contents = line.read().split()
+    def get_uptime_seconds(self):
+        return self.backend.uptime_seconds()
 
-        total_seconds = float(contents[0])
+    def get_uptime(self):
+
+        total_seconds = self.get_uptime_seconds()
 
         MINUTE = 60
         HOUR = MINUTE * 60
@@ -26,7 +109,41 @@ class SystemCollector(object):
 
         return uptime
 
-    def get_system_info(self):
+    def get_boot_id(self):
+        """
+        Random id of the current boot (Linux only), ``None`` when unknown.
+
+        """
+        try:
+            with open(os.path.join(self.backend.root, 'sys', 'kernel', 'random', 'boot_id'), 'r') as f:
+                return f.read().strip() or None
+        except EnvironmentError:
+            return None
+
+    @timed('collector.system_info')
+    def get_system_info(self, state=None):
+        """
+        Distribution and processor of the host.
+
+        They do not change until a reboot, so with ``state`` the inventory is
+        kept there for the boot (and the version of the collector) it was
+        read in.
+
+        """
+        if state is None:
+            return self.read_system_info()
+
+        key = {'boot_id': self.get_boot_id(), 'version': __import__('simocollector').__versionstr__}
+        cached = state.get('host_inventory')
+        if key['boot_id'] is not None and cached and cached['key'] == key:
+            return cached['system_info']
+
+        system_info = self.read_system_info()
+        if key['boot_id'] is not None:
+            state.set('host_inventory', {'key': key, 'system_info': system_info})
+        return system_info
+
+    def read_system_info(self):
         distro = {}
         system_info = {}
         dist = platform.dist()
@@ -40,60 +157,45 @@ class SystemCollector(object):
         system_info["distro"] = distro
 
         processor = {
-            'cpu-cores': psutil.NUM_CPUS
+            'cpu-cores': self.backend.num_cpus(),
+            'model-name': self.get_cpu_model_name(),
         }
 
-        try:
-            if os.path.exists('/proc/cpuinfo'):
-                model_name_raw = subprocess.Popen(['grep', '"model name"', '-m', '1', '/proc/cpuinfo'],
-                                                  stdout=subprocess.PIPE,
-                                                  close_fds=True).communicate()[0]
-                cpu_model_name = model_name_raw.replace('model name', '').strip().lstrip(':').strip()
-            elif os.path.exists('/var/run/dmesg.boot'):
-                model_name_raw = subprocess.Popen(['grep', 'CPU:', '/var/run/dmesg.boot'],
-                                                  stdout=subprocess.PIPE,
-                                                  close_fds=True).communicate()[0]
-                cpu_model_name = model_name_raw.replace('CPU:', '').strip()
-            else:
-                cpu_model_name = 'unknown'
-        except Exception:
-            cpu_model_name = 'unknown'
-
-        processor['model-name'] = cpu_model_name
-
         system_info["processor"] = processor
 
         return system_info
 
+    def get_cpu_model_name(self):
+        cpuinfo = os.path.join(self.backend.root, 'cpuinfo')
+        try:
+            if os.path.exists(cpuinfo):
+                with open(cpuinfo, 'r') as f:
+                    for line in f:
+                        if line.startswith('model name'):
+                            return line.partition(':')[2].strip()
+            elif os.path.exists('/var/run/dmesg.boot'):
+                with open('/var/run/dmesg.boot', 'r') as f:
+                    for line in f:
+                        if line.startswith('CPU:'):
+                            return line[len('CPU:'):].strip()
+        except EnvironmentError:
+            pass
+        return 'unknown'
+
+    @timed('collector.memory_info')
     def get_memory_info(self):
-        _swap_columns = ('swap_total', 'swap_used', 'swap_free', 'swap_percent_used')
-        swap_values = dict(zip(_swap_columns, psutil.swap_memory()))
-        memory_usage = psutil.virtual_memory()
-
-        raw_data = {
-            "total": memory_usage.total,
-            "free": memory_usage.free,
-            "used": memory_usage.used,
-            "percent_used": int(memory_usage.percent)
-        }
-
-        raw_data.update(swap_values)
+        total, free, used, percent = self.backend.virtual_memory()
+        swap_total, swap_used, swap_free, swap_percent = self.backend.swap_memory()
 
-        data = {}
-        for name, value in raw_data.iteritems():
-            value = int(value)
-            if name.find('percent') is -1:
-                value /= 1024 * 1024  # Convert to MB
-
-            data[name] = value
-
-        return data
+        MB = 1024 * 1024
+        return MemoryRecord(int(total) / MB, int(free) / MB, int(used) / MB, int(percent),
+                            int(swap_total) / MB, int(swap_used) / MB, int(swap_free) / MB, int(swap_percent))
 
+    @timed('collector.disk_usage')
     def get_disk_usage(self, path_list):
-        _columns = ('total', 'used', 'free')
-        data = {}
+        import psutil
 
-        partition_list = psutil.disk_partitions(all=True)
+        data = {}
 
         def _sanitize(p):
             if len(p) > 1:
@@ -101,105 +203,328 @@ class SystemCollector(object):
             return p
         path_list = map(_sanitize, path_list)
 
-        for path in path_list:
+        for path, (device, mountpoint, fstype, opts) in self.get_partitions(path_list).iteritems():
+            if os.name == 'nt':
+                if 'cdrom' in opts or fstype == '':
+                    # skip cd-rom drives with no disk in it; they may raise
+                    # ENOENT, pop-up a Windows GUI error for a non-ready
+                    # partition or just hang.
+                    continue
             try:
-                part = filter(lambda x: x.mountpoint == path, partition_list)[0]
-                if os.name == 'nt':
-                    if 'cdrom' in part.opts or part.fstype == '':
-                        # skip cd-rom drives with no disk in it; they may raise
-                        # ENOENT, pop-up a Windows GUI error for a non-ready
-                        # partition or just hang.
-                        continue
-                usage = psutil.disk_usage(part.mountpoint)
-                row = dict(zip(_columns, map(lambda x: x / (1024 * 1024), usage)))  # Convert to MB
-                row['volume'] = part.device
-                row['path'] = part.mountpoint
-                row['percent'] = int(usage.percent)
-
-                data[part.device] = row
-            except IndexError:
-                pass
+                usage = psutil.disk_usage(mountpoint)
+            except EnvironmentError:
+                # Unmounted in the meantime
+                continue
+            total, used, free = [value / (1024 * 1024) for value in usage[:3]]  # Convert to MB
+            data[device] = DiskUsageRecord(total, used, free, int(usage.percent), device, mountpoint)
 
         return data
 
-    def get_disk_io(self):
-        raw_data = psutil.disk_io_counters(True)
-        data = {}
-        for disk_name, disk_data in raw_data.iteritems():
-            row_data = dict(disk_data._asdict())
-            row_data['read_kb'] = row_data['read_bytes'] / 1024  # Convert to KB
-            row_data['write_kb'] = row_data['write_bytes'] / 1024  # Convert to KB
-            del(row_data['read_bytes'])
-            del(row_data['write_bytes'])
+    def get_partitions(self, path_list):
+        """
+        Return ``{path: (device, mountpoint, fstype, opts)}`` of the mount
+        points in ``path_list``.
 
-            data[disk_name] = row_data
+        """
+        try:
+            return self.mount_table.lookup(path_list)
+        except EnvironmentError:
+            # No mountinfo (not Linux), list the partitions by psutil
+            import psutil
+
+            partitions = {}
+            for partition in psutil.disk_partitions(all=True):
+                if partition.mountpoint in path_list and partition.mountpoint not in partitions:
+                    partitions[partition.mountpoint] = tuple(partition)
+            return partitions
+
+    def get_counter_changes(self, state, key, counters):
+        """
+        Compute deltas and per-second rates of ``counters`` since the
+        previous reading kept in ``state`` under ``key``.
+
+        ``counters`` maps a device to its raw counter values. Returns the same
+        mapping of ``(delta, rate)`` tuples. Devices and counters without a
+        previous reading (first run, new device) have no changes, after a
+        reboot (uptime went backwards) the changes are computed since boot.
+
+        """
+        now = time.time()
+        uptime = self.get_uptime_seconds()
+        previous = state.get(key)
+        state.set(key, {'time': now, 'uptime': uptime, 'counters': counters})
+
+        if not previous:
+            return {}
+
+        rebooted = uptime < previous['uptime']
+        elapsed = uptime if rebooted else now - previous['time']
+
+        changes = {}
+        for device, values in counters.iteritems():
+            if rebooted:
+                # Counters of every device started from zero at boot
+                device_previous = dict.fromkeys(values, 0)
+            elif device in previous['counters']:
+                device_previous = previous['counters'][device]
+            else:
+                continue
+
+            changes[device] = {}
+            for name, value in values.iteritems():
+                if name not in device_previous:
+                    continue
+                delta = counter_delta(value, device_previous[name])
+                rate = round(delta / elapsed, 2) if elapsed > 0 else 0.0
+                changes[device][name] = (delta, rate)
+
+        return changes
+
+    @timed('collector.disk_io')
+    def get_disk_io(self, state=None):
+        """
+        Cumulative disk I/O counters. With ``state`` also ``*_delta`` and
+        ``*_per_sec`` values since the previous call.
+
+        """
+        raw_data = self.backend.disk_io_counters()
+        data = {}
+        counters = {}
+        for disk_name, row_data in raw_data.iteritems():
+            counters[disk_name] = {
+                'read_count': row_data['read_count'],
+                'write_count': row_data['write_count'],
+                'read_bytes': row_data['read_bytes'],
+                'write_bytes': row_data['write_bytes'],
+            }
+            data[disk_name] = DiskIORecord(row_data['read_count'], row_data['write_count'],
+                                           row_data['read_bytes'] / 1024,  # Convert to KB
+                                           row_data['write_bytes'] / 1024,  # Convert to KB
+                                           row_data['read_time'], row_data['write_time'])
+
+        if state is not None:
+            self._add_counter_changes(data, self.get_counter_changes(state, 'disk_io', counters))
 
         return data
 
-    def get_network_traffic(self):
+    @timed('collector.network_traffic')
+    def get_network_traffic(self, state=None):
+        """
+        Cumulative network traffic counters. With ``state`` also ``*_delta``
+        and ``*_per_sec`` values since the previous call.
+
+        """
         data = {}
-        for device, stat in psutil.net_io_counters(pernic=True).iteritems():
-            data[device] = {'kb_received': stat.bytes_recv / 1024, 'kb_transmitted': stat.bytes_sent / 1024}
+        counters = {}
+        for device, (bytes_sent, bytes_recv) in self.backend.net_io_counters().iteritems():
+            data[device] = NetworkTrafficRecord(bytes_recv / 1024, bytes_sent / 1024)
+            counters[device] = {'bytes_received': bytes_recv, 'bytes_transmitted': bytes_sent}
+
+        if state is not None:
+            self._add_counter_changes(data, self.get_counter_changes(state, 'network_traffic', counters))
 
         return data
 
+    def _add_counter_changes(self, data, changes):
+        for device, device_changes in changes.iteritems():
+            row = data[device]
+            for name, (delta, rate) in device_changes.iteritems():
+                if name in KB_FIELDS:
+                    # Byte counters are sent in KB
+                    name = KB_FIELDS[name]
+                    delta /= 1024
+                    rate = round(rate / 1024, 2)
+                if isinstance(row, Record):
+                    # Fields of records are set directly, without the dict interface
+                    setattr(row, '{0}_delta'.format(name), delta)
+                    setattr(row, '{0}_per_sec'.format(name), rate)
+                else:
+                    row['{0}_delta'.format(name)] = delta
+                    row['{0}_per_sec'.format(name)] = rate
+
+    @timed('collector.load_average')
     def get_load_average(self):
-        _loadavg_columns = ('minute', 'five_minutes', 'fifteen_minutes')
-        load_dict = dict(zip(_loadavg_columns, os.getloadavg()))
+        minute, five_minutes, fifteen_minutes = self.backend.load_average()
+        return LoadAverageRecord(minute, five_minutes, fifteen_minutes, self.backend.num_cpus())
+
+    @timed('collector.cpu_utilization')
+    def get_cpu_utilization(self, state=None):
+        """
+        CPU time percentages since the previous call.
+
+        Previous reading of CPU times is kept in ``state`` (see
+        ``simocollector.state.StateStore``), so the call does not block.
+        Without the previous reading (first run, reboot) percentages are
+        computed since boot.
+
+        """
+        current = self.backend.cpu_times()
+
+        previous = None
+        if state is not None:
+            previous = state.get('cpu_times')
+            state.set('cpu_times', current)
+
+        if not previous or len(previous) != len(current) or \
+                any(c < p for c, p in zip(current, previous)):
+            previous = [0.0] * len(current)
+
+        deltas = [c - p for c, p in zip(current, previous)]
+        all_delta = sum(deltas)
+        cpu_time_percent = []
+        for delta in deltas:
+            try:
+                cpu_time_percent.append(round((100 * delta) / all_delta, 1))
+            except ZeroDivisionError:
+                cpu_time_percent.append(0.0)
 
-        cores = psutil.NUM_CPUS
-        load_dict['cores'] = cores
+        return CPURecord(*cpu_time_percent)
 
-        return load_dict
+system_info_collector = SystemCollector()
 
-    def get_cpu_utilization(self):
-        _columns = ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal', 'quest', 'quest_nice')
-        cpu_time_percent = psutil.cpu_times_percent(interval=3)
-        data = dict(zip(_columns, cpu_time_percent))
-        return data
+_system_collectors = {DEFAULT_BACKEND: system_info_collector}
+
+
+def get_system_collector(config):
+    """
+    Return system collector with the backend chosen by ``collector_backend``
+    of the configuration, one instance per backend. The procfs backend reads
+    the procfs mounted at ``procfs_root``.
+
+    """
+    name = config.get('collector_backend', DEFAULT_BACKEND)
+    if name not in BACKENDS:
+        raise Exception('Collector backend {0} is not supported.'.format(name))
+
+    if name == 'procfs':
+        root = config.get('procfs_root', DEFAULT_PROCFS_ROOT)
+        key = (name, root)
+        if key not in _system_collectors:
+            _system_collectors[key] = SystemCollector(ProcfsBackend(root))
+    else:
+        key = name
+        if key not in _system_collectors:
+            _system_collectors[key] = SystemCollector(BACKENDS[name]())
+
+    return _system_collectors[key]
+
+
+# Processes reported by CPU and by memory
+DEFAULT_PROCESSES_TOP = 10
 
-system_info_collector = SystemCollector()
+
+def top_processes(records, top):
+    """
+    Return ``(by_cpu, by_memory, count)``, lists of ``top`` records of
+    ``ProcessScanner`` with the highest CPU usage and resident memory,
+    highest first, and the number of records. Only ``2 * top`` records are
+    kept while ``records`` is consumed.
+
+    """
+    by_cpu = []
+    by_memory = []
+    count = 0
+    for record in records:
+        pid, command, cpu_percent, rss = record
+        # Negative position keeps ties in the order of the scan and records uncompared
+        for heap, item in ((by_cpu, (cpu_percent, -count, record)), (by_memory, (rss, -count, record))):
+            if len(heap) < top:
+                heapq.heappush(heap, item)
+            elif heap and item > heap[0]:
+                heapq.heapreplace(heap, item)
+        count += 1
+
+    return ([item[2] for item in sorted(by_cpu, reverse=True)],
+            [item[2] for item in sorted(by_memory, reverse=True)],
+            count)
 
 
 class ProcessInfoCollector(object):
-    def __init__(self):
-        memory = system_info_collector.get_memory_info()
-        self.total_memory = memory['total']
+    def __init__(self, scanner=None):
+        self.scanner = scanner or ProcessScanner()
 
+    @timed('collector.process_list')
     def process_list(self):
-        stats = subprocess.Popen(['pidstat', '-ruht'],
-                                 stdout=subprocess.PIPE, close_fds=True) \
-            .communicate()[0]
+        converted_data = []
+        for pid, command, cpu_percent, rss in self.scanner.scan():
+            process_memory_mb = float(rss) / (1024 * 1024)  # Convert to MB
+            memory = "{0:.3}".format(process_memory_mb)
+            cpu = "{0:.2f}".format(cpu_percent)
 
-        stats_data = stats.splitlines()
-        del stats_data[0:2]  # Deletes Unix system data
+            extracted_data = {"cpu:%": cpu,
+                              "memory:mb": memory,
+                              "command": command}
+            converted_data.append(extracted_data)
 
-        converted_data = []
-        for line in stats_data:
-            if re.search('command', line, re.IGNORECASE):  # Matches the first line
-                header = line.split()
-                del header[0]  # Deletes the # symbol
-            else:
-                command = line.split()
-                data_dict = dict(zip(header, command))
+        return converted_data
 
-                process_memory_mb = float(self.total_memory / 100) * float(
-                    data_dict["%MEM"].replace(",", "."))  # Convert the % in MB
-                memory = "{0:.3}".format(process_memory_mb)
-                memory = memory.replace(",", ".")
+    @timed('collector.top_processes')
+    def get_top_processes(self, top=DEFAULT_PROCESSES_TOP):
+        """
+        Return ``{'top_cpu': [..], 'top_memory': [..], 'count': ..}`` with
+        ``top`` processes using most CPU and memory, and the number of
+        scanned processes.
 
-                cpu = "{0:.2f}".format(float(data_dict["%CPU"].replace(",", ".")))
-                cpu = cpu.replace(",", ".")
+        """
+        by_cpu, by_memory, scanned = top_processes(self.scanner.iter_scan(), top)
 
-                command = data_dict["Command"]
+        def convert(rows):
+            return [{'pid': pid, 'command': command, 'cpu_percent': round(cpu_percent, 2),
+                     'memory_mb': round(float(rss) / (1024 * 1024), 2)}
+                    for pid, command, cpu_percent, rss in rows]
 
-                if not re.search('_', command, re.IGNORECASE):
-                    extracted_data = {"cpu:%": cpu,
-                                      "memory:mb": memory,
-                                      "command": command}
-                    converted_data.append(extracted_data)
+        return {'top_cpu': convert(by_cpu), 'top_memory': convert(by_memory), 'count': scanned}
+
+
+_process_info_collectors = {}
+
+
+def get_process_info_collector(config=None):
+    """
+    Return collector of the processes in the procfs mounted at
+    ``procfs_root`` of the configuration, one instance per root.
+
+    """
+    root = (config or {}).get('procfs_root', DEFAULT_PROCFS_ROOT)
+    if root not in _process_info_collectors:
+        _process_info_collectors[root] = ProcessInfoCollector(ProcessScanner(root))
+    return _process_info_collectors[root]
+
+
+class CgroupCollector(object):
+    def __init__(self, scanner=None, system_collector=None):
+        self.scanner = scanner or CgroupScanner()
+        self.system_collector = system_collector or system_info_collector
+
+    @timed('collector.cgroups')
+    def get_cgroups(self, state=None):
+        """
+        Cumulative values of the cgroups. With ``state`` also ``*_delta`` and
+        ``*_per_sec`` values of the counters since the previous call.
+
+        """
+        data = self.scanner.scan()
+        if state is not None:
+            counters = {}
+            for name, values in data.iteritems():
+                counters[name] = dict((field, values[field]) for field in CGROUP_COUNTERS if field in values)
+            changes = self.system_collector.get_counter_changes(state, 'cgroups', counters)
+            self.system_collector._add_counter_changes(data, changes)
+        return data
+
+
+_cgroup_collectors = {}
 
-        return converted_data
 
+def get_cgroup_collector(config):
+    """
+    Return collector of cgroups under ``cgroup_root`` matching
+    ``cgroup_patterns`` of the configuration.
 
-process_info_collector = ProcessInfoCollector()
+    """
+    root = config.get('cgroup_root', DEFAULT_CGROUP_ROOT)
+    patterns = tuple(config.get('cgroup_patterns') or ())
+    key = (root, patterns)
+    if key not in _cgroup_collectors:
+        _cgroup_collectors[key] = CgroupCollector(CgroupScanner(root, patterns), get_system_collector(config))
+    return _cgroup_collectors[key]
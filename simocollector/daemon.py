@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+__all__ = ['DEFAULT_INTERVALS', 'get_intervals', 'Job', 'Daemon']
+
+import time
+
+from simocollector.adaptive import AdaptiveScheduler
+from simocollector.backoff import DEFAULT_INTERVALS, RetryBudget, get_intervals, get_jitter, get_retry_after
+from simocollector.dispatch import Dispatcher
+from simocollector.sampling import SAMPLED_TYPES, DEFAULT_HISTORY, Sampler
+from simocollector.sender import DEFAULT_SEND_METHOD, DEFAULT_REPLAY_RATE, build_sender
+from simocollector.spool import DEFAULT_BATCH_SIZE
+from simocollector.stats import flush_stats
+
+
+# Seconds of spool replay at a time, between them the scheduled collections run
+REPLAY_TICK = 1
+
+
+class Job(object):
+
+    def __init__(self, name, sender, interval):
+        self.name = name
+        self.sender = sender
+        self.interval = interval
+        self.next_run = 0
+
+    def is_due(self, now):
+        return now >= self.next_run
+
+    def schedule(self, now):
+        self.next_run = now + self.interval
+
+
+class Daemon(object):
+    """
+    Run every collection type in one process, each on its own interval.
+
+    Configuration and senders are built only once, so a collection costs
+    just the collection and the HTTP request itself. Collections due at the
+    same time run concurrently. With ``adaptive`` in the configuration the
+    intervals follow the collected values, see
+    ``simocollector.adaptive.AdaptiveScheduler``. First runs are delayed by
+    the offsets of the host, see ``simocollector.backoff.get_jitter``.
+    Spooled payloads are replayed in small batches between the scheduled
+    collections, at most ``spool_replay_rate`` per second.
+
+    """
+
+    def __init__(self, config, types=DEFAULT_SEND_METHOD, on_response=None, on_error=None):
+        intervals = get_intervals(config)
+        self.config = config
+        self.jobs = [Job(name, build_sender(name, config), intervals[name]) for name in types]
+        self.dispatcher = Dispatcher.from_config(config)
+        self.sampler = self.build_sampler(config)
+        self.scheduler = AdaptiveScheduler(self.jobs, config) if config.get('adaptive') else None
+        self.on_response = on_response
+        self.on_error = on_error
+        self.running = False
+        self.replay_job = None
+        self.replay_left = 0
+        self.next_replay = 0
+
+    def build_sampler(self, config):
+        """
+        With ``sampling_rate`` (samples per second) in the configuration,
+        values of ``sampling_types`` are sampled between reports, and their
+        min, max, mean and 95th percentile are sent with every report.
+        ``sampling_history`` seconds of samples are kept in memory.
+
+        """
+        rate = float(config.get('sampling_rate', 0))
+        if rate <= 0:
+            return None
+
+        types = config.get('sampling_types', SAMPLED_TYPES)
+        senders = [job.sender for job in self.jobs if job.name in types and job.sender.aggregated_fields]
+        if not senders:
+            return None
+
+        sampler = Sampler(senders, rate, float(config.get('sampling_history', DEFAULT_HISTORY)))
+        for sender in senders:
+            sender.sampler = sampler
+        return sampler
+
+    def run_pending(self):
+        now = time.time()
+        due = [job for job in self.jobs if job.is_due(now)]
+        if due:
+            self.run_jobs(due, now)
+        if self.replay_job is not None and now >= self.next_replay:
+            self.replay_spool(now)
+
+    def run_jobs(self, due, now):
+        budget = RetryBudget.from_config(self.config)
+        for job in due:
+            job.schedule(now)
+            job.sender.retry_budget = budget
+
+        delivered = None
+        for job, (sender, response, exc_info) in zip(due, self.dispatcher.dispatch([job.sender for job in due])):
+            if exc_info is None:
+                delivered = job
+                if self.scheduler is not None:
+                    self.scheduler.adapt(job, sender.last_data)
+                if self.on_response is not None:
+                    self.on_response(job, response)
+                continue
+
+            retry_after = get_retry_after(exc_info[1])
+            if retry_after is not None:
+                # Server asked for more time than the retries of the cycle could wait,
+                # longer than any interval would be taken for a clock change by get_sleep_time
+                retry_after = min(retry_after, max(other.interval for other in self.jobs))
+                job.next_run = max(job.next_run, now + retry_after)
+            if self.on_error is None:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            self.on_error(job, exc_info[1])
+
+        if delivered is not None:
+            # Server is reachable again, deliver what was spooled while it was not
+            self.replay_job = delivered
+            self.replay_left = int(self.config.get('spool_replay_batch', DEFAULT_BATCH_SIZE))
+
+        flush_stats(self.config)
+
+    def replay_spool(self, now):
+        """
+        Replay spooled payloads of one tick, without waiting between them, the
+        rate is kept by the ticks.
+
+        """
+        job = self.replay_job
+        rate = float(self.config.get('spool_replay_rate', DEFAULT_REPLAY_RATE))
+        batch_size = min(max(int(rate * REPLAY_TICK), 1), self.replay_left) if rate > 0 else self.replay_left
+        try:
+            sent = job.sender.replay_spool(batch_size, 0)
+        except Exception, e:
+            sent = 0
+            if self.on_error is None:
+                self.replay_job = None
+                raise
+            self.on_error(job, e)
+
+        self.replay_left -= batch_size
+        if sent < batch_size or self.replay_left <= 0:
+            # Spool is empty or the server failed again
+            self.replay_job = None
+        self.next_replay = now + (batch_size / rate if rate > 0 else 0)
+
+    def get_sleep_time(self):
+        now = time.time()
+        next_run = min(job.next_run for job in self.jobs)
+        # The wall clock went backwards, reschedule everything from now on
+        if next_run - now > max(job.interval for job in self.jobs):
+            for job in self.jobs:
+                job.next_run = now
+            return 0
+        if self.replay_job is not None:
+            next_run = min(next_run, self.next_replay)
+        return max(next_run - now, 0)
+
+    def stagger(self, now):
+        for job in self.jobs:
+            job.next_run = now + get_jitter(self.config, job.name, job.interval)
+
+    def run_forever(self):
+        self.running = True
+        self.stagger(time.time())
+        if self.sampler is not None:
+            self.sampler.start()
+        try:
+            while self.running:
+                self.run_pending()
+                time.sleep(self.get_sleep_time())
+        finally:
+            if self.sampler is not None:
+                self.sampler.stop()
+
+    def stop(self):
+        self.running = False
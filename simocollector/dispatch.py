@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+__all__ = ['DEFAULT_WORKERS', 'DEFAULT_MAX_IN_FLIGHT', 'capture', 'run_concurrently', 'Dispatcher']
+
+import sys
+import time
+import threading
+
+
+DEFAULT_WORKERS = 6
+DEFAULT_MAX_IN_FLIGHT = 4
+
+
+def capture(func, *args):
+    """
+    Call ``func``, return ``(result, None)`` or ``(None, exc_info)``.
+
+    """
+    try:
+        return func(*args), None
+    except Exception:
+        return None, sys.exc_info()
+
+
+def run_concurrently(func, items, workers):
+    """
+    Call ``func`` on every item in at most ``workers`` threads, return list
+    of ``capture`` results in the order of ``items``.
+
+    The threads live for this call only, so that nothing is left running
+    at the exit of one-shot runs.
+
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [capture(func, item) for item in items]
+
+    results = [None] * len(items)
+    indexes = iter(range(len(items)))
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            with lock:
+                index = next(indexes, None)
+            if index is None:
+                return
+            results[index] = capture(func, items[index])
+
+    threads = [threading.Thread(target=work) for i in range(min(workers, len(items)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class Dispatcher(object):
+    """
+    Run ``send`` of several senders concurrently.
+
+    Every sender gets its own deadline (its ``get_timeout``) and its errors
+    are returned rather than raised, so one slow or failing endpoint does
+    not stall or break the others. A sender past its deadline keeps running
+    in its thread, and is not dispatched again until it finishes.
+
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        from multiprocessing.pool import ThreadPool
+
+        self.pool = ThreadPool(workers)
+        self._running = set()
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(self._lock)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Dispatcher with ``dispatch_workers`` threads, limiting the process to
+        ``max_in_flight`` concurrent HTTP requests.
+
+        """
+        from simocollector.transport import connection_pool
+
+        connection_pool.limit_in_flight(int(config.get('max_in_flight', DEFAULT_MAX_IN_FLIGHT)))
+        return cls(int(config.get('dispatch_workers', DEFAULT_WORKERS)))
+
+    def dispatch(self, senders):
+        """
+        Return list of ``(sender, response, exc_info)`` in the order of
+        ``senders``.
+
+        """
+        from multiprocessing import TimeoutError
+
+        started = time.time()
+        pending = []
+        for sender in senders:
+            with self._lock:
+                running = sender in self._running
+                self._running.add(sender)
+            if running:
+                # Senders keep state of their previous run, they must not run twice at once
+                pending.append((sender, None))
+            else:
+                pending.append((sender, self.pool.apply_async(self._send, (sender, ))))
+
+        results = []
+        for sender, pending_result in pending:
+            if pending_result is None:
+                response, exc_info = capture(self._raise_running, sender)
+                results.append((sender, response, exc_info))
+                continue
+
+            deadline = started + sender.get_timeout()
+            try:
+                response, exc_info = pending_result.get(max(deadline - time.time(), 0))
+            except TimeoutError:
+                # The sender keeps running in its thread until its requests time out
+                response, exc_info = capture(self._raise_timeout, sender)
+            results.append((sender, response, exc_info))
+
+        return results
+
+    def _send(self, sender):
+        try:
+            return capture(sender.send)
+        finally:
+            with self._lock:
+                self._running.discard(sender)
+                self._finished.notify_all()
+
+    def wait(self, senders):
+        """
+        Wait until the dispatched ``senders`` finish, also the ones past
+        their deadline.
+
+        """
+        with self._lock:
+            while any(sender in self._running for sender in senders):
+                self._finished.wait()
+
+    def _raise_running(self, sender):
+        raise Exception('Collection {0} is still running.'.format(sender.name))
+
+    def _raise_timeout(self, sender):
+        raise Exception('Collection {0} did not finish in {1} seconds.'.format(sender.name, sender.get_timeout()))
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Payload encodings of the uploads.
+
+Besides JSON a payload may be encoded by a compact binary serialization,
+where every distinct string (keys, disk and device urls, ...) is written
+only once and later occurrences refer to it. Either encoding may be
+compressed by gzip (``Content-Encoding: gzip``).
+
+"""
+__all__ = ['JSON', 'BINARY', 'GZIP', 'ENCODINGS', 'COMPRESSIONS', 'dumps_binary', 'loads_binary',
+           'encode_payload', 'decode_payload']
+
+import gzip
+import json
+import struct
+from StringIO import StringIO
+
+from simocollector.records import Record, dumps_json
+
+
+JSON = 'json'
+BINARY = 'binary'
+GZIP = 'gzip'
+
+CONTENT_TYPES = {
+    JSON: 'application/json',
+    BINARY: 'application/x-simo-binary',
+}
+
+ENCODINGS = tuple(CONTENT_TYPES)
+COMPRESSIONS = (None, GZIP)
+
+BINARY_VERSION = '\x01'
+
+_NONE = 'N'
+_TRUE = 'T'
+_FALSE = 'F'
+_INT = 'i'
+_FLOAT = 'd'
+_STRING = 's'
+_STRING_REF = 'r'
+_LIST = 'l'
+_MAP = 'm'
+
+_double = struct.Struct('>d')
+
+
+def _write_varint(out, value):
+    while value > 0x7f:
+        out.append(chr((value & 0x7f) | 0x80))
+        value >>= 7
+    out.append(chr(value))
+
+
+def _read_varint(data, position):
+    result = 0
+    shift = 0
+    while True:
+        byte = ord(data[position])
+        position += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, position
+        shift += 7
+
+
+def dumps_binary(obj):
+    out = [BINARY_VERSION]
+    strings = {}
+
+    def write_string(value):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        if value in strings:
+            out.append(_STRING_REF)
+            _write_varint(out, strings[value])
+        else:
+            strings[value] = len(strings)
+            out.append(_STRING)
+            _write_varint(out, len(value))
+            out.append(value)
+
+    def write(value):
+        if value is None:
+            out.append(_NONE)
+        elif value is True:
+            out.append(_TRUE)
+        elif value is False:
+            out.append(_FALSE)
+        elif isinstance(value, (int, long)):
+            out.append(_INT)
+            # Zigzag encoding keeps small negative numbers short
+            _write_varint(out, value * 2 if value >= 0 else -value * 2 - 1)
+        elif isinstance(value, float):
+            out.append(_FLOAT)
+            out.append(_double.pack(value))
+        elif isinstance(value, basestring):
+            write_string(value)
+        elif isinstance(value, (list, tuple)):
+            out.append(_LIST)
+            _write_varint(out, len(value))
+            for item in value:
+                write(item)
+        elif isinstance(value, dict):
+            out.append(_MAP)
+            _write_varint(out, len(value))
+            for key, item in value.iteritems():
+                write_string(key)
+                write(item)
+        elif isinstance(value, Record):
+            items = list(value.iteritems())
+            out.append(_MAP)
+            _write_varint(out, len(items))
+            for key, item in items:
+                write_string(key)
+                write(item)
+        else:
+            raise TypeError('{0!r} is not serializable'.format(value))
+
+    write(obj)
+    return ''.join(out)
+
+
+def loads_binary(data):
+    if data[:1] != BINARY_VERSION:
+        raise ValueError('Unsupported binary payload version.')
+
+    strings = []
+
+    def read(position):
+        tag = data[position]
+        position += 1
+        if tag == _NONE:
+            return None, position
+        if tag == _TRUE:
+            return True, position
+        if tag == _FALSE:
+            return False, position
+        if tag == _INT:
+            value, position = _read_varint(data, position)
+            return (value >> 1) if not value & 1 else -((value + 1) >> 1), position
+        if tag == _FLOAT:
+            return _double.unpack_from(data, position)[0], position + _double.size
+        if tag == _STRING:
+            length, position = _read_varint(data, position)
+            value = data[position:position + length].decode('utf-8')
+            strings.append(value)
+            return value, position + length
+        if tag == _STRING_REF:
+            index, position = _read_varint(data, position)
+            return strings[index], position
+        if tag == _LIST:
+            count, position = _read_varint(data, position)
+            items = []
+            for i in xrange(count):
+                item, position = read(position)
+                items.append(item)
+            return items, position
+        if tag == _MAP:
+            count, position = _read_varint(data, position)
+            items = {}
+            for i in xrange(count):
+                key, position = read(position)
+                items[key], position = read(position)
+            return items, position
+        raise ValueError('Unknown tag {0!r} at position {1}.'.format(tag, position - 1))
+
+    try:
+        value, position = read(1)
+    except IndexError:
+        raise ValueError('Truncated binary payload.')
+    if position != len(data):
+        raise ValueError('Extra data after binary payload.')
+    return value
+
+
+def _gzip(data):
+    out = StringIO()
+    f = gzip.GzipFile(fileobj=out, mode='wb')
+    try:
+        f.write(data)
+    finally:
+        f.close()
+    return out.getvalue()
+
+
+def _gunzip(data):
+    f = gzip.GzipFile(fileobj=StringIO(data), mode='rb')
+    try:
+        return f.read()
+    finally:
+        f.close()
+
+
+def encode_payload(obj, encoding=JSON, compression=None):
+    """
+    Return ``(body, headers)`` of ``obj`` encoded by ``encoding`` and
+    compressed by ``compression``. ``obj`` may contain records of
+    ``simocollector.records``.
+
+    """
+    if encoding not in ENCODINGS:
+        raise Exception('Payload encoding {0} is not supported.'.format(encoding))
+    if compression not in COMPRESSIONS:
+        raise Exception('Payload compression {0} is not supported.'.format(compression))
+
+    body = dumps_json(obj) if encoding == JSON else dumps_binary(obj)
+    headers = {'Content-Type': CONTENT_TYPES[encoding]}
+    if compression == GZIP:
+        body = _gzip(body)
+        headers['Content-Encoding'] = GZIP
+
+    return body, headers
+
+
+def decode_payload(body, content_type=None, content_encoding=None):
+    """
+    Decode payload encoded by ``encode_payload`` back to an object.
+
+    """
+    if content_encoding == GZIP:
+        body = _gunzip(body)
+    elif content_encoding not in (None, '', 'identity'):
+        raise ValueError('Unsupported content encoding {0}.'.format(content_encoding))
+
+    if content_type and content_type.split(';')[0].strip() == CONTENT_TYPES[BINARY]:
+        return loads_binary(body)
+    return json.loads(body)
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the SIMO server API.
+
+It accepts the endpoints of ``URL_LIST`` (including their bulk variants),
+remembers every received object and answers the same way as SIMO does, with
+the posted object extended by its ``url``. Latency, server errors and
+throttling of a loaded server can be injected. Run it with::
+
+  $ python -m simocollector.mockserver --port 8000
+  $ python -m simocollector.mockserver --port 8000 --latency 0.05 --error-rate 0.01 --rate-limit 200
+
+"""
+__all__ = ['MockSimoServer']
+
+import sys
+import time
+import random
+import argparse
+import base64
+import threading
+
+from simocollector.encoding import decode_payload
+from simocollector.httpserver import RequestHandler, ThreadingHTTPServer
+from simocollector.sender import URL_LIST, BULK_URL_SUFFIX
+
+
+class MockRequestHandler(RequestHandler):
+
+    def do_POST(self):
+        simo = self.server.simo
+        body = self.read_body()
+
+        if not simo.is_authorized(self.headers.get('Authorization')):
+            return self.respond(401, {'detail': 'Authentication credentials were not provided.'})
+
+        name, bulk = simo.resolve(self.path)
+        if name is None:
+            return self.respond(404, {'detail': 'Not found'})
+
+        simo.log_bytes(len(body))
+        fault = simo.inject_fault()
+        if fault == 429:
+            return self.respond(429, {'detail': 'Request was throttled.'},
+                                {'Retry-After': str(simo.retry_after)})
+        if fault is not None:
+            return self.respond(fault, {'detail': 'Injected server error.'})
+
+        if not simo.encodings and (self.headers.get('Content-Encoding') or
+                                   self.headers.get('Content-Type') != 'application/json'):
+            return self.respond(415, {'detail': 'Unsupported media type'})
+
+        try:
+            data = decode_payload(body, self.headers.get('Content-Type'), self.headers.get('Content-Encoding'))
+        except (ValueError, IOError):
+            return self.respond(400, {'detail': 'Payload parse error'})
+
+        if bulk and not isinstance(data, list):
+            return self.respond(400, {'detail': 'Expected a list of items.'})
+
+        simo.log_request(self.path)
+        if bulk:
+            result = [simo.store(name, item) for item in data]
+        else:
+            result = simo.store(name, data)
+
+        self.respond(201, result)
+
+
+class MockSimoServer(object):
+    """
+    SIMO API stand-in running in a background thread.
+
+    ``bulk`` switches the bulk endpoints on and off and ``encodings`` the
+    support of other payload encodings than plain JSON, so that fallbacks
+    of the senders can be exercised as well.
+
+    Every request is answered after ``latency`` seconds. ``error_rate`` of
+    the requests fail with 500, requests over ``rate_limit`` per second are
+    throttled with 429 and ``Retry-After: <retry_after>``. Without ``keep``
+    received objects are only counted, so that long load tests do not fill
+    the memory.
+
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, username=None, password=None, bulk=True, encodings=True,
+                 verbose=False, latency=0, error_rate=0, rate_limit=None, retry_after=1, keep=True):
+        self.httpd = ThreadingHTTPServer((host, port), MockRequestHandler)
+        self.httpd.simo = self
+        self.httpd.verbose = verbose
+        self.username = username
+        self.password = password
+        self.bulk = bulk
+        self.encodings = encodings
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.keep = keep
+        self.received = []
+        self.requests = []
+        self.stored = 0
+        self.bytes_received = 0
+        self.faults = {}
+        self._tokens = rate_limit
+        self._refilled = time.time()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._paths = dict((path, name) for name, path in URL_LIST.iteritems())
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return 'http://{0}:{1}'.format(host, port)
+
+    def resolve(self, path):
+        if self.bulk and path.endswith(BULK_URL_SUFFIX):
+            name = self._paths.get(path[:-len(BULK_URL_SUFFIX)])
+            if name is not None:
+                return name, True
+        return self._paths.get(path), False
+
+    def is_authorized(self, header):
+        if self.username is None:
+            return True
+        credentials = base64.b64encode('{0}:{1}'.format(self.username, self.password))
+        return header == 'Basic {0}'.format(credentials)
+
+    def take_token(self):
+        # Token bucket refilled by rate_limit tokens per second, holding at most one second of them
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self._tokens + (now - self._refilled) * self.rate_limit, self.rate_limit)
+            self._refilled = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def inject_fault(self):
+        """
+        Wait for the latency, return status code of an injected error
+        response, ``None`` to answer normally.
+
+        """
+        if self.latency:
+            time.sleep(self.latency)
+
+        code = None
+        if self.rate_limit and not self.take_token():
+            code = 429
+        elif self.error_rate and random.random() < self.error_rate:
+            code = 500
+
+        if code is not None:
+            with self._lock:
+                self.faults[code] = self.faults.get(code, 0) + 1
+        return code
+
+    def log_request(self, path):
+        if not self.keep:
+            return
+        with self._lock:
+            self.requests.append(path)
+
+    def log_bytes(self, count):
+        with self._lock:
+            self.bytes_received += count
+
+    def store(self, name, item):
+        with self._lock:
+            if self.keep:
+                self.received.append((name, item))
+            self.stored += 1
+            object_id = self.stored
+
+        result = dict(item) if isinstance(item, dict) else {'data': item}
+        result['url'] = '{0}{1}{2}/'.format(self.url, URL_LIST[name], object_id)
+        return result
+
+    def get_received(self, name):
+        return [item for item_name, item in self.received if item_name == name]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.httpd.close_connections()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the SIMO server API')
+    parser.add_argument('--host', default='127.0.0.1', type=str, help='address to listen on (default 127.0.0.1)')
+    parser.add_argument('--port', default=8000, type=int, help='port to listen on (default 8000)')
+    parser.add_argument('--no-bulk', dest='bulk', action='store_false', help='disable bulk endpoints')
+    parser.add_argument('--json-only', dest='encodings', action='store_false',
+                        help='accept plain JSON payloads only')
+    parser.add_argument('--latency', default=0, type=float, help='seconds to wait before every response')
+    parser.add_argument('--error-rate', default=0, type=float, help='fraction of requests failing with 500')
+    parser.add_argument('--rate-limit', type=float, help='requests per second over which requests get 429')
+    parser.add_argument('--retry-after', default=1, type=int, help='Retry-After of throttled requests (default 1)')
+    parser.add_argument('--discard', dest='keep', action='store_false',
+                        help='count received objects instead of keeping them')
+    parser.add_argument('--quiet', dest='verbose', action='store_false', help='do not log requests')
+    args = parser.parse_args()
+
+    server = MockSimoServer(args.host, args.port, bulk=args.bulk, encodings=args.encodings, verbose=args.verbose,
+                            latency=args.latency, error_rate=args.error_rate, rate_limit=args.rate_limit,
+                            retry_after=args.retry_after, keep=args.keep)
+    print('Mock SIMO server is listening on {0}'.format(server.url))
+    sys.stdout.flush()
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""
+Collector backend reading the Linux procfs directly.
+
+Files are opened once and re-read from the start into preallocated buffers,
+only the fields sent to SIMO are parsed. Values are computed the same way as
+psutil does, so both backends give identical output.
+
+"""
+__all__ = ['DEFAULT_PROCFS_ROOT', 'ProcFile', 'ProcfsBackend', 'MountTable', 'ProcessScanner']
+
+import io
+import os
+import re
+import select
+import hashlib
+import threading
+
+
+DEFAULT_PROCFS_ROOT = '/proc'
+
+SECTOR_SIZE = 512
+
+
+class ProcFile(object):
+    """
+    Procfs file kept open and re-read by seek and read into a buffer,
+    which grows when the file does not fit in.
+
+    """
+
+    def __init__(self, path, size=4096):
+        self.path = path
+        self._file = None
+        self._buffer = bytearray(size)
+        self._lock = threading.Lock()
+
+    def read(self):
+        with self._lock:
+            if self._file is None:
+                self._file = io.open(self.path, 'rb', buffering=0)
+
+            while True:
+                self._file.seek(0)
+                view = memoryview(self._buffer)
+                length = 0
+                while length < len(self._buffer):
+                    count = self._file.readinto(view[length:])
+                    if not count:
+                        break
+                    length += count
+
+                if length < len(self._buffer):
+                    return str(self._buffer[:length])
+                self._buffer = bytearray(len(self._buffer) * 2)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class ProcfsBackend(object):
+    name = 'procfs'
+
+    def __init__(self, root=DEFAULT_PROCFS_ROOT):
+        self.root = root
+        self.clock_ticks = os.sysconf('SC_CLK_TCK')
+        self._files = {}
+        self._num_cpus = None
+
+    def _read(self, name):
+        proc_file = self._files.get(name)
+        if proc_file is None:
+            proc_file = self._files[name] = ProcFile(os.path.join(self.root, name))
+        return proc_file.read()
+
+    def close(self):
+        for proc_file in self._files.itervalues():
+            proc_file.close()
+
+    def num_cpus(self):
+        if self._num_cpus is None:
+            try:
+                self._num_cpus = os.sysconf('SC_NPROCESSORS_ONLN')
+            except ValueError:
+                self._num_cpus = 0
+            if self._num_cpus <= 0:
+                self._num_cpus = self._read('cpuinfo').lower().count('\nprocessor') or 1
+        return self._num_cpus
+
+    def cpu_times(self):
+        stat = self._read('stat')
+        values = stat[:stat.index('\n')].split()[1:11]
+        return [float(value) / self.clock_ticks for value in values]
+
+    def _read_meminfo(self):
+        meminfo = {}
+        for line in self._read('meminfo').splitlines():
+            name, _, value = line.partition(':')
+            if name in ('MemTotal', 'MemFree', 'Buffers', 'Cached', 'SwapTotal', 'SwapFree'):
+                meminfo[name] = int(value.split()[0]) * 1024
+                if len(meminfo) == 6:
+                    break
+        return meminfo
+
+    def virtual_memory(self):
+        meminfo = self._read_meminfo()
+        total = meminfo['MemTotal']
+        free = meminfo['MemFree']
+        avail = free + meminfo['Buffers'] + meminfo['Cached']
+        used = total - free
+        percent = round(float(total - avail) / total * 100, 1) if total else 0
+        return total, free, used, percent
+
+    def swap_memory(self):
+        meminfo = self._read_meminfo()
+        total = meminfo['SwapTotal']
+        free = meminfo['SwapFree']
+        used = total - free
+        percent = round(float(used) / total * 100, 1) if total else 0
+        return total, used, free, percent
+
+    def load_average(self):
+        # /proc/loadavg is rounded to two decimal places, the syscall is not
+        return os.getloadavg()
+
+    def uptime_seconds(self):
+        return float(self._read('uptime').split()[0])
+
+    def _get_disk_names(self):
+        # Same selection as psutil: partitions, and whole disks without partitions
+        names = []
+        for line in reversed(self._read('partitions').splitlines()[2:]):
+            name = line.split()[3]
+            if name[-1].isdigit():
+                names.append(name)
+            elif not names or not names[-1].startswith(name):
+                names.append(name)
+        return set(names)
+
+    def disk_io_counters(self):
+        names = self._get_disk_names()
+        data = {}
+        for line in self._read('diskstats').splitlines():
+            fields = line.split()
+            name = fields[2]
+            if name in names:
+                data[name] = {
+                    'read_count': int(fields[3]),
+                    'write_count': int(fields[7]),
+                    'read_bytes': int(fields[5]) * SECTOR_SIZE,
+                    'write_bytes': int(fields[9]) * SECTOR_SIZE,
+                    'read_time': int(fields[6]),
+                    'write_time': int(fields[10]),
+                }
+        return data
+
+    def net_io_counters(self):
+        data = {}
+        for line in self._read('net/dev').splitlines()[2:]:
+            colon = line.rfind(':')
+            fields = line[colon + 1:].split()
+            data[line[:colon].strip()] = (int(fields[8]), int(fields[0]))
+        return data
+
+
+class MountTable(object):
+    """
+    Index of the mount points of ``/proc/self/mountinfo`` to
+    ``(device, mountpoint, fstype, opts)``.
+
+    Only mount points asked for are indexed. The index is rebuilt only when
+    the mount table changed, which the kernel signals by ``POLLPRI`` on the
+    open file, and its contents differ from the indexed ones.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._poll = None
+        self._digest = None
+        self._mountpoints = None
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def _read(self):
+        if self._file is None:
+            self._file = io.open(self.path, 'rb')
+            if hasattr(select, 'poll'):
+                self._poll = select.poll()
+                self._poll.register(self._file.fileno(), select.POLLPRI | select.POLLERR)
+        self._file.seek(0)
+        return self._file.read()
+
+    def _changed(self):
+        return self._poll is None or bool(self._poll.poll(0))
+
+    def lookup(self, mountpoints):
+        """
+        Return ``{mountpoint: (device, mountpoint, fstype, opts)}`` of the
+        mounted ones of ``mountpoints``.
+
+        """
+        mountpoints = frozenset(mountpoints)
+        with self._lock:
+            if self._file is None or self._changed() or mountpoints != self._mountpoints:
+                contents = self._read()
+                digest = hashlib.md5(contents).digest()
+                if digest != self._digest or mountpoints != self._mountpoints:
+                    self._index = self._build_index(contents, mountpoints)
+                    self._digest = digest
+                    self._mountpoints = mountpoints
+            return dict(self._index)
+
+    def _build_index(self, contents, mountpoints):
+        index = {}
+        for line in contents.splitlines():
+            fields = line.split()
+            mountpoint = _unescape(fields[4])
+            if mountpoint not in mountpoints:
+                continue
+            separator = fields.index('-', 6)
+            fstype, device = fields[separator + 1:separator + 3]
+            # Mounted later over the same mount point hides the earlier one
+            index[mountpoint] = (device, mountpoint, fstype, fields[5])
+        return index
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._poll = None
+
+
+def _unescape(path):
+    # Space, tab, newline and backslash are escaped as octal numbers
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), path)
+
+
+# Process flag of kernel threads (PF_KTHREAD in include/linux/sched.h)
+PF_KTHREAD = 0x00200000
+
+
+class ProcessScanner(object):
+    """
+    Scanner of ``/proc/[pid]`` computing CPU usage of processes incrementally.
+
+    CPU time of every process is kept between scans, so CPU percentage
+    covers the time since the previous scan (since the start of a process
+    on its first scan). Command name and kind of a process are parsed only
+    when its pid is seen for the first time. Kernel threads are told apart
+    by their ``PF_KTHREAD`` flag and skipped.
+
+    """
+
+    def __init__(self, root=DEFAULT_PROCFS_ROOT):
+        self.root = root
+        self.clock_ticks = float(os.sysconf('SC_CLK_TCK'))
+        self.page_size = os.sysconf('SC_PAGE_SIZE')
+        self._processes = {}
+        self._last_uptime = None
+
+    def _read(self, *path):
+        with open(os.path.join(self.root, *path), 'rb') as f:
+            return f.read()
+
+    def scan(self):
+        """
+        Return list of ``(pid, command, cpu_percent, rss_bytes)`` of user
+        space processes.
+
+        """
+        return list(self.iter_scan())
+
+    def iter_scan(self):
+        """
+        Generate ``(pid, command, cpu_percent, rss_bytes)`` of user space
+        processes one by one. The state of the scanner is updated once all
+        of them were generated, a scan stopped before keeps the previous
+        one.
+
+        """
+        uptime = float(self._read('uptime').split()[0])
+        elapsed = uptime - self._last_uptime if self._last_uptime is not None else None
+
+        processes = {}
+        for pid in os.listdir(self.root):
+            if not pid.isdigit():
+                continue
+
+            try:
+                stat = self._read(pid, 'stat')
+                statm = self._read(pid, 'statm')
+            except EnvironmentError:
+                # Process has exited in the meantime
+                continue
+
+            # Command may contain spaces and parentheses, fields start after the last ')'.
+            # Only the fields up to the start time are split, the other 30 odd are not needed
+            end_of_command = stat.rfind(')')
+            fields = stat[end_of_command + 2:].split(None, 20)
+            cpu_time = int(fields[11]) + int(fields[12])
+            start_time = fields[19]
+
+            known = self._processes.get(pid)
+            if known is not None and known[0] == start_time:
+                command, kernel_thread, previous_cpu_time = known[1:]
+                cpu_elapsed = elapsed
+            else:
+                command = stat[stat.find('(') + 1:end_of_command]
+                kernel_thread = bool(int(fields[6]) & PF_KTHREAD)
+                previous_cpu_time = 0
+                cpu_elapsed = uptime - int(start_time) / self.clock_ticks
+
+            processes[pid] = (start_time, command, kernel_thread, cpu_time)
+            if kernel_thread:
+                continue
+
+            if cpu_elapsed > 0:
+                cpu_percent = (cpu_time - previous_cpu_time) / self.clock_ticks / cpu_elapsed * 100
+            else:
+                cpu_percent = 0.0
+            rss = int(statm.split()[1]) * self.page_size
+
+            yield int(pid), command, cpu_percent, rss
+
+        # Forget processes which do not exist any more
+        self._processes = processes
+        self._last_uptime = uptime
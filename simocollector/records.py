@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+Records of the collected samples.
+
+A record holds one sample of a metric family (memory, disk I/O of a disk,
+...) in ``__slots__`` instead of a dict, and is written to the payload by
+``to_json`` (or ``simocollector.encoding.dumps_binary``) without being
+converted to a dict first. Records are read and written like dicts, fields
+which were not set are not sent.
+
+"""
+__all__ = ['Record', 'MemoryRecord', 'LoadAverageRecord', 'CPURecord', 'DiskUsageRecord', 'DiskIORecord',
+           'NetworkTrafficRecord', 'RecordEncoder', 'dumps_json']
+
+import json
+from operator import attrgetter
+from json.encoder import encode_basestring_ascii
+
+
+def _json_float(value):
+    if value - value == 0:
+        # Finite floats are written by json as their repr
+        return repr(value)
+    # NaN and infinity are not valid JSON, the value is missing
+    return 'null'
+
+
+def _json_value(value):
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, (int, long)):
+        return str(value)
+    if isinstance(value, float):
+        return _json_float(value)
+    if isinstance(value, basestring):
+        return encode_basestring_ascii(value)
+    return json.dumps(value)
+
+
+# JSON of the values of the usual types
+_JSON_ENCODERS = {
+    int: str,
+    long: str,
+    float: _json_float,
+    str: encode_basestring_ascii,
+    unicode: encode_basestring_ascii,
+    bool: _json_value,
+    type(None): _json_value,
+}
+
+
+class _Layout(object):
+    """
+    Sent fields of a record class, with the JSON template of a record with
+    all of them set.
+
+    """
+
+    def __init__(self, cls):
+        self.fields = []
+        for name in cls.__slots__ + ('created', 'server'):
+            if name not in cls.internal_fields:
+                self.fields.append((name, '{0}: '.format(encode_basestring_ascii(name))))
+        self.template = '{' + ', '.join(prefix + '%s' for name, prefix in self.fields) + '}'
+        self.getter = attrgetter(*[name for name, prefix in self.fields])
+
+
+class Record(object):
+    """
+    Sample of a metric family, with the ``created`` time and ``server``
+    added by the senders.
+
+    Fields of a subclass are its ``__slots__``, sent in that order except
+    the ``internal_fields``, the measured ones are arguments of the
+    constructor. Keys without a field (aggregates of samples, ...) are kept
+    in ``extra``.
+
+    """
+
+    __slots__ = ('created', 'server', 'extra')
+
+    internal_fields = ()
+
+    _layout = None
+
+    @classmethod
+    def get_layout(cls):
+        # Computed once per class, kept in the class itself rather than inherited
+        layout = cls.__dict__.get('_layout')
+        if layout is None:
+            layout = cls._layout = _Layout(cls)
+        return layout
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            extra = getattr(self, 'extra', None)
+            if extra is not None and key in extra:
+                return extra[key]
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key != 'extra':
+            try:
+                setattr(self, key, value)
+                return
+            except AttributeError:
+                # Not a field of the record
+                pass
+        extra = getattr(self, 'extra', None)
+        if extra is None:
+            extra = self.extra = {}
+        extra[key] = value
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = dict(other.iteritems())
+        return dict(self.iteritems()) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '{0}({1})'.format(type(self).__name__, ', '.join(
+            '{0}={1!r}'.format(name, value) for name, value in self.iteritems()))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def update(self, values):
+        for key, value in values.iteritems():
+            self[key] = value
+
+    def iteritems(self):
+        """
+        Generate ``(name, value)`` of the sent fields which were set.
+
+        """
+        for name, prefix in self.get_layout().fields:
+            try:
+                yield name, getattr(self, name)
+            except AttributeError:
+                pass
+        extra = getattr(self, 'extra', None)
+        if extra:
+            for item in extra.iteritems():
+                yield item
+
+    def keys(self):
+        return [name for name, value in self.iteritems()]
+
+    def to_dict(self):
+        return dict(self.iteritems())
+
+    def to_json(self):
+        layout = self.get_layout()
+        if getattr(self, 'extra', None) is None:
+            try:
+                return layout.template % tuple([_JSON_ENCODERS[type(value)](value)
+                                                for value in layout.getter(self)])
+            except (AttributeError, KeyError):
+                # Some fields are not set, or of other types
+                pass
+
+        parts = []
+        for name, value in self.iteritems():
+            parts.append('{0}: {1}'.format(encode_basestring_ascii(name), _json_value(value)))
+        return '{' + ', '.join(parts) + '}'
+
+
+class MemoryRecord(Record):
+    """
+    Memory and swap in MB, percentages as integers.
+
+    """
+
+    __slots__ = ('total', 'free', 'used', 'percent_used', 'swap_total', 'swap_used', 'swap_free',
+                 'swap_percent_used')
+
+    def __init__(self, total, free, used, percent_used, swap_total, swap_used, swap_free, swap_percent_used):
+        self.total = total
+        self.free = free
+        self.used = used
+        self.percent_used = percent_used
+        self.swap_total = swap_total
+        self.swap_used = swap_used
+        self.swap_free = swap_free
+        self.swap_percent_used = swap_percent_used
+
+
+class LoadAverageRecord(Record):
+    __slots__ = ('minute', 'five_minutes', 'fifteen_minutes', 'cores')
+
+    def __init__(self, minute, five_minutes, fifteen_minutes, cores):
+        self.minute = minute
+        self.five_minutes = five_minutes
+        self.fifteen_minutes = fifteen_minutes
+        self.cores = cores
+
+
+class CPURecord(Record):
+    """
+    Percentages of CPU time, older kernels do not report the last ones.
+
+    """
+
+    __slots__ = ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal', 'quest', 'quest_nice')
+
+    def __init__(self, *percentages):
+        for name, value in zip(self.__slots__, percentages):
+            setattr(self, name, value)
+
+
+class DiskUsageRecord(Record):
+    """
+    Usage of a mounted disk in MB, only used and free space and the percent
+    used are sent.
+
+    """
+
+    __slots__ = ('used', 'free', 'percent', 'disk', 'total', 'volume', 'path')
+
+    internal_fields = ('total', 'volume', 'path')
+
+    def __init__(self, total, used, free, percent, volume, path):
+        self.total = total
+        self.used = used
+        self.free = free
+        self.percent = percent
+        self.volume = volume
+        self.path = path
+
+
+class DiskIORecord(Record):
+    """
+    Cumulative disk I/O counters (read and written data in KB), with
+    changes since the previous sample.
+
+    """
+
+    __slots__ = ('read_count', 'write_count', 'read_kb', 'write_kb', 'read_time', 'write_time',
+                 'read_count_delta', 'read_count_per_sec', 'write_count_delta', 'write_count_per_sec',
+                 'read_kb_delta', 'read_kb_per_sec', 'write_kb_delta', 'write_kb_per_sec', 'disk')
+
+    def __init__(self, read_count, write_count, read_kb, write_kb, read_time, write_time):
+        self.read_count = read_count
+        self.write_count = write_count
+        self.read_kb = read_kb
+        self.write_kb = write_kb
+        self.read_time = read_time
+        self.write_time = write_time
+
+
+class NetworkTrafficRecord(Record):
+    """
+    Cumulative received and transmitted KB of a network device, with
+    changes since the previous sample.
+
+    """
+
+    __slots__ = ('received', 'transmitted', 'received_delta', 'transmitted_delta', 'received_per_sec',
+                 'transmitted_per_sec', 'device')
+
+    def __init__(self, received, transmitted):
+        self.received = received
+        self.transmitted = transmitted
+
+
+class RecordEncoder(json.JSONEncoder):
+    """
+    JSON encoder of records anywhere in the encoded object.
+
+    """
+
+    def default(self, obj):
+        if isinstance(obj, Record):
+            return obj.to_dict()
+        return json.JSONEncoder.default(self, obj)
+
+
+def dumps_json(obj):
+    """
+    ``json.dumps`` of ``obj``, which may be or contain records. Records and
+    lists starting with one are written by ``to_json``, records elsewhere
+    by ``RecordEncoder``.
+
+    """
+    if isinstance(obj, Record):
+        return obj.to_json()
+    if isinstance(obj, (list, tuple)) and obj and isinstance(obj[0], (Record, list, tuple)):
+        return '[' + ', '.join([dumps_json(item) for item in obj]) + ']'
+    return json.dumps(obj, cls=RecordEncoder)
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Relay between collectors of nearby hosts and the SIMO server.
+
+Collectors configured with the relay as their ``server`` post to it as they
+would to SIMO. Objects of the collections are queued per endpoint of
+``URL_LIST`` and forwarded by the relay's senders in bulk over a few
+persistent connections, so the load on SIMO grows with the number of relays
+rather than with the number of hosts. The queue is kept in a spool, objects
+are acknowledged only once they are written to it, so that a restart of the
+relay does not lose them. Registrations (server, disks, network devices) are
+passed through, their responses are needed by the installer.
+
+"""
+__all__ = ['DEFAULT_RELAY_PORT', 'DEFAULT_FLUSH_INTERVAL', 'DEFAULT_MAX_PENDING', 'RelaySender', 'Relay']
+
+import os
+import json
+import time
+import threading
+import urllib2
+
+from simocollector.backoff import RetryBudget
+from simocollector.dispatch import Dispatcher
+from simocollector.encoding import decode_payload
+from simocollector.httpserver import RequestHandler, ThreadingHTTPServer
+from simocollector.sender import URL_LIST, BULK_URL_SUFFIX, BaseMultiObjectSender
+from simocollector.spool import DEFAULT_SPOOL_DIR, DEFAULT_MAX_SIZE, Spool
+
+
+DEFAULT_RELAY_PORT = 8100
+
+# Seconds between forwards of the queued objects
+DEFAULT_FLUSH_INTERVAL = 5
+
+# Queued objects over which collectors are asked to retry later
+DEFAULT_MAX_PENDING = 100000
+
+# Spool of the queued objects, under the spool directory of the configuration
+QUEUE_DIRNAME = 'relay-queue'
+
+# Endpoints passed through to SIMO
+REGISTRATIONS = ('server', 'disk', 'netdevice')
+
+
+def _count_objects(record):
+    return len(record['data'])
+
+
+class RelaySender(BaseMultiObjectSender):
+    """
+    Sender of the objects of one collection queued by the relay.
+
+    """
+
+    bulk_upload = True
+
+    def __init__(self, config, name, relay):
+        super(RelaySender, self).__init__(config)
+        self.name = name
+        self.relay = relay
+
+    def get_data(self):
+        return self.relay.take(self.name)
+
+    def get_required_config_params(self):
+        return 'server', 'username', 'password'
+
+
+class RelayRequestHandler(RequestHandler):
+
+    def do_POST(self):
+        relay = self.server.relay
+        body = self.read_body()
+
+        if self.headers.get('Authorization') != relay.get_authorization():
+            return self.respond(401, {'detail': 'Authentication credentials were not provided.'})
+
+        name, bulk = relay.resolve(self.path)
+        if name is None:
+            return self.respond(404, {'detail': 'Not found'})
+
+        if name in REGISTRATIONS:
+            code, content_type, data = relay.pass_through(self.path, body, self.headers)
+            return self.respond_raw(code, data, content_type)
+
+        try:
+            data = decode_payload(body, self.headers.get('Content-Type'), self.headers.get('Content-Encoding'))
+        except (ValueError, IOError):
+            return self.respond(400, {'detail': 'Payload parse error'})
+
+        if bulk and not isinstance(data, list):
+            return self.respond(400, {'detail': 'Expected a list of items.'})
+
+        # Collectors spool the payload and send it again later
+        try:
+            queued = relay.put(name, data if bulk else [data])
+        except EnvironmentError:
+            return self.respond(503, {'detail': 'Relay queue is not writable.'})
+        if not queued:
+            return self.respond(503, {'detail': 'Relay queue is full.'})
+
+        self.respond(202, data)
+
+
+class Relay(object):
+    """
+    Relay listening on ``host:port``, forwarding to the server of
+    ``config`` with its credentials.
+
+    Collectors have to use the same credentials. Objects are queued in the
+    spool at ``relay_queue_dir`` and forwarded every
+    ``relay_flush_interval`` seconds, at most ``relay_max_pending`` objects
+    are queued.
+
+    """
+
+    def __init__(self, config, host='0.0.0.0', port=DEFAULT_RELAY_PORT, on_error=None, verbose=False):
+        self.config = config
+        self.httpd = ThreadingHTTPServer((host, port), RelayRequestHandler)
+        self.httpd.relay = self
+        self.httpd.verbose = verbose
+        self.flush_interval = float(config.get('relay_flush_interval', DEFAULT_FLUSH_INTERVAL))
+        self.max_pending = int(config.get('relay_max_pending', DEFAULT_MAX_PENDING))
+        self.on_error = on_error
+        self.dispatcher = Dispatcher.from_config(config)
+        self.senders = dict((name, RelaySender(config, name, self))
+                            for name in URL_LIST if name not in REGISTRATIONS)
+        self.registration_sender = RelaySender(config, 'server', self)
+        self._paths = dict((path, name) for name, path in URL_LIST.iteritems())
+        self.queue = Spool(config.get('relay_queue_dir', os.path.join(config.get('spool_dir', DEFAULT_SPOOL_DIR),
+                                                                      QUEUE_DIRNAME)),
+                           max_size=int(config.get('relay_queue_max_size', DEFAULT_MAX_SIZE)),
+                           on_evict=self._evicted)
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Objects acknowledged before a restart are forwarded as well
+        self._pending_count = self.queue.count(_count_objects)
+        self._stopped = threading.Event()
+        self._threads = []
+        self.running = False
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return 'http://{0}:{1}'.format(host, port)
+
+    def resolve(self, path):
+        if path.endswith(BULK_URL_SUFFIX):
+            name = self._paths.get(path[:-len(BULK_URL_SUFFIX)])
+            if name is not None:
+                return name, True
+        return self._paths.get(path), False
+
+    def get_authorization(self):
+        return self.registration_sender.get_headers()['Authorization']
+
+    def pass_through(self, path, body, headers):
+        """
+        Post the request to SIMO, return ``(code, content type, body)`` of
+        its response.
+
+        """
+        sender = self.registration_sender
+        request_headers = dict((name, headers[name]) for name in ('Content-Type', 'Content-Encoding')
+                               if headers.get(name))
+        try:
+            response = sender.send_data('{0}{1}'.format(sender.get_server_url(), path), body, request_headers)
+            return response.code, response.headers.get('Content-Type', 'application/json'), response.read()
+        except urllib2.HTTPError, e:
+            return e.code, e.headers.get('Content-Type', 'application/json'), e.read()
+        except Exception, e:
+            return 502, 'application/json', json.dumps({'detail': str(e)})
+
+    def put(self, name, items):
+        """
+        Queue ``items`` of collection ``name``, return False when the queue
+        is full.
+
+        """
+        with self._lock:
+            if self._pending_count + len(items) > self.max_pending:
+                return False
+            self._pending_count += len(items)
+
+        try:
+            self.queue.append(name, items)
+        except EnvironmentError:
+            with self._lock:
+                self._pending_count -= len(items)
+            raise
+        return True
+
+    def _evicted(self, records):
+        with self._lock:
+            self._pending_count -= sum(_count_objects(record) for record in records)
+
+    def take(self, name):
+        with self._lock:
+            return self._pending.pop(name, [])
+
+    def flush(self):
+        """
+        Forward the queued objects of all collections concurrently.
+
+        """
+        self.queue.drain(self.forward)
+
+    def forward(self, records):
+        """
+        Forward objects of queued ``records``, return the records which were
+        not, they stay in the queue. Objects which could not be delivered
+        are in the spool of their sender then.
+
+        """
+        with self._lock:
+            for record in records:
+                self._pending.setdefault(record['url'], []).extend(record['data'])
+            senders = [self.senders[name] for name in self._pending]
+
+        budget = RetryBudget.from_config(self.config)
+        for sender in senders:
+            sender.retry_budget = budget
+
+        delivered = None
+        for sender, response, exc_info in self.dispatcher.dispatch(senders):
+            if exc_info is None:
+                delivered = sender
+            elif self.on_error is not None:
+                self.on_error(sender.name, exc_info[1])
+
+        # Objects are not removed from the queue before their senders are done with them
+        self.dispatcher.wait(senders)
+        with self._lock:
+            # Objects of senders which did not run are taken from the queue again by the next flush
+            left = set(self._pending)
+            self._pending.clear()
+            kept = [record for record in records if record['url'] in left]
+            self._pending_count -= sum(_count_objects(record) for record in records if record['url'] not in left)
+
+        if delivered is not None:
+            # SIMO is reachable again, deliver what was spooled while it was not
+            try:
+                delivered.replay_spool()
+            except Exception, e:
+                if self.on_error is not None:
+                    self.on_error(delivered.name, e)
+
+        return kept
+
+    def run_flushes(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def start(self):
+        for target in (self.httpd.serve_forever, self.run_flushes):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def run_forever(self):
+        self.running = True
+        self.start()
+        try:
+            while self.running:
+                time.sleep(1)
+        finally:
+            self.close()
+
+    def stop(self):
+        self.running = False
+
+    def close(self):
+        """
+        Stop accepting payloads and forward the queued ones.
+
+        """
+        if self._threads:
+            self.httpd.shutdown()
+        self.httpd.server_close()
+        self.httpd.close_connections()
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.flush()
+        self.dispatcher.close()
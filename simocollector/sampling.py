@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+__all__ = ['SAMPLED_TYPES', 'DEFAULT_HISTORY', 'Sampler']
+
+import threading
+
+from simocollector.timeseries import TimeSeriesStore
+from simocollector.utils import monotonic
+
+
+# Collections whose values can change quickly between two reports
+SAMPLED_TYPES = ('loadavg', 'memory', 'cpu')
+
+# Seconds of samples kept in memory
+DEFAULT_HISTORY = 60 * 60
+
+
+class Sampler(object):
+    """
+    Samples senders in a background thread ``rate`` times per second.
+
+    Senders provide the samples by their ``sample`` method (``None`` when
+    there is no sample yet) and the sampled fields by
+    ``aggregated_fields``. The last ``history`` seconds of samples are kept
+    in ``series``. Aggregates of the samples since the previous report are
+    taken by ``take``.
+
+    """
+
+    def __init__(self, senders, rate=1.0, history=DEFAULT_HISTORY):
+        self.senders = senders
+        self.interval = 1.0 / rate
+        self.series = TimeSeriesStore(max(int(history * rate), 1))
+        self._taken = dict((sender.name, None) for sender in senders)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        for sender in self.senders:
+            try:
+                sample = sender.sample()
+            except Exception:
+                # A failed sample is just missing in the aggregates
+                continue
+            if sample is None:
+                continue
+            # Older kernels do not report all the fields, e.g. steal time of CPU
+            fields = [field for field in sender.aggregated_fields if field in sample]
+            with self._lock:
+                self.series.append(sender.name, sample, fields)
+
+    def take(self, name):
+        with self._lock:
+            now = monotonic()
+            result = self.series.aggregate(name, self._taken[name], now)
+            self._taken[name] = now
+            return result
+
+    def run(self):
+        next_run = monotonic()
+        while not self._stopped.is_set():
+            self.sample()
+            next_run = max(next_run + self.interval, monotonic())
+            self._stopped.wait(next_run - monotonic())
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
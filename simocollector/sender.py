@@ -1,15 +1,53 @@
 # -*- coding: utf-8 -*-
-__all__ = ['ALLOWED_SEND_METHOD', 'build_sender', 'BaseSender', 'MemorySender', 'LoadaAvgSender', 'CPUSender']
+__all__ = ['DEFAULT_SEND_METHOD', 'ALLOWED_SEND_METHOD', 'SENDERS', 'build_sender', 'BaseSender', 'MemorySender', 'LoadaAvgSender', 'CPUSender']
 
+import time
+import socket
+import httplib
 import urllib2
 import json
 import datetime
 import base64
+import urlparse
 
-from simocollector.collectors import system_info_collector
+from simocollector.backoff import RetryBudget, is_retryable
+from simocollector.collectors import (DEFAULT_PROCESSES_TOP, get_system_collector, get_cgroup_collector,
+                                      get_process_info_collector)
+from simocollector.dispatch import DEFAULT_MAX_IN_FLIGHT, capture, run_concurrently
+from simocollector.encoding import JSON, encode_payload
+from simocollector.spool import DEFAULT_SPOOL_DIR, DEFAULT_MAX_SIZE, DEFAULT_BATCH_SIZE, Spool
+from simocollector.state import StateStore, get_state_store
+from simocollector.stats import stats, get_stats_summary
+from simocollector.transport import DEFAULT_TIMEOUT, connection_pool
 
 
-ALLOWED_SEND_METHOD = ('loadavg', 'cpu', 'memory', 'diskusage', 'diskio', 'networktraffic')
+# Collections sent when no type is given
+DEFAULT_SEND_METHOD = ('loadavg', 'cpu', 'memory', 'diskusage', 'diskio', 'networktraffic')
+
+ALLOWED_SEND_METHOD = DEFAULT_SEND_METHOD + ('selfstats', 'cgroups', 'processes')
+
+# Bulk endpoint of a collection is its URL from URL_LIST followed by this suffix
+BULK_URL_SUFFIX = 'bulk/'
+
+# Objects posted to a bulk endpoint in one request
+DEFAULT_BULK_BATCH_SIZE = 500
+
+# Responses meaning that the SIMO server has no bulk endpoint for a collection
+BULK_UNSUPPORTED_CODES = (404, 405, 501)
+
+# Spooled records replayed per second
+DEFAULT_REPLAY_RATE = 10
+
+
+def is_delivery_error(e):
+    """
+    Return True when the payload was not accepted for reasons on the way or
+    on the server side, so that sending it again later makes sense.
+
+    """
+    if isinstance(e, urllib2.HTTPError):
+        return e.code >= 500 or e.code in (408, 429)
+    return isinstance(e, (urllib2.URLError, socket.error, httplib.HTTPException))
 
 URL_LIST = {
     'memory': '/api/memory/',
@@ -21,25 +59,39 @@ URL_LIST = {
     'diskio': '/api/disk-io/',
     'netdevice': '/api/network-device/',
     'networktraffic': '/api/network-traffic/',
+    'selfstats': '/api/collector-stats/',
+    'cgroups': '/api/cgroup/',
+    'processes': '/api/processes/',
 }
 
 
 class SenderMixin(object):
 
-    def send_data(self, url, data):
-        base64string = base64.encodestring(
-            '{0}:{1}'.format(self.get_username(), self.get_password())).replace('\n', '')
+    _headers = None
 
-        headers = {
-            'Content-Type': 'application/json',
-            'User-Agent': 'SIMO Collector {0}'.format(__import__('simocollector').__versionstr__),
-            'Authorization': "Basic {0}".format(base64string)
-        }
-        request = urllib2.Request(url, None, headers=headers)
-
-        response = urllib2.urlopen(request, data=data)
-
-        return response
+    def send_data(self, url, data, headers=None):
+        request_headers = self.get_headers()
+        if headers:
+            request_headers = dict(request_headers, **headers)
+        try:
+            with stats.timer('http.{0}'.format(urlparse.urlsplit(url).path)):
+                return connection_pool.urlopen(url, data, request_headers, timeout=self.get_timeout())
+        except urllib2.HTTPError, e:
+            stats.increment('http.status.{0}'.format(e.code))
+            raise
+
+    def get_headers(self):
+        # Credentials do not change, so the headers are built only once
+        if self._headers is None:
+            base64string = base64.encodestring(
+                '{0}:{1}'.format(self.get_username(), self.get_password())).replace('\n', '')
+
+            self._headers = {
+                'Content-Type': 'application/json',
+                'User-Agent': 'SIMO Collector {0}'.format(__import__('simocollector').__versionstr__),
+                'Authorization': "Basic {0}".format(base64string)
+            }
+        return self._headers
 
     def get_username(self):
         return ''
@@ -47,30 +99,58 @@ class SenderMixin(object):
     def get_password(self):
         return ''
 
+    def get_timeout(self):
+        return DEFAULT_TIMEOUT
+
 
 class BaseSender(SenderMixin):
 
     name = ''
+    use_spool = True
+    encoding_unsupported = False
+
+    # Fields sampled between reports by simocollector.sampling.Sampler
+    aggregated_fields = ()
+    sampler = None
+
+    # Retries of the current cycle, see simocollector.backoff.RetryBudget
+    retry_budget = None
+
+    # Data of the last report
+    last_data = None
 
     def __init__(self, config):
         self.validate_config(config)
         self.config = config
 
+    def get_server_url(self):
+        return self.config['server'].rstrip('/')
+
     def get_url(self):
         try:
-            return '{0}{1}'.format(self.config['server'].rstrip('/'), URL_LIST[self.name])
+            return '{0}{1}'.format(self.get_server_url(), URL_LIST[self.name])
         except KeyError:
             raise Exception('Collection {0} is not allowed.'.format(self.name))
 
     def get_data(self):
         return {}
 
+    def sample(self):
+        return self.get_data()
+
     def get_username(self):
         return self.config['username']
 
     def get_password(self):
         return self.config['password']
 
+    def get_timeout(self):
+        timeout = self.config.get('timeouts', {}).get(self.name, self.config.get('timeout', DEFAULT_TIMEOUT))
+        return float(timeout)
+
+    def get_max_in_flight(self):
+        return int(self.config.get('max_in_flight', DEFAULT_MAX_IN_FLIGHT))
+
     def add_additional_data(self, data):
         data['created'] = datetime.datetime.now().isoformat()
 
@@ -87,44 +167,246 @@ class BaseSender(SenderMixin):
     def get_required_config_params(self):
         return 'server', 'server_id', 'username', 'password'
 
+    def get_payload_encoding(self):
+        """
+        Return ``(encoding, compression)`` of payloads, see
+        ``simocollector.encoding``.
+
+        """
+        if self.encoding_unsupported:
+            return JSON, None
+        return self.config.get('payload_encoding', JSON), self.config.get('payload_compression')
+
+    def send_payload(self, url, data):
+        encoding, compression = self.get_payload_encoding()
+        body, headers = encode_payload(data, encoding, compression)
+        stats.increment('sender.{0}.payloads'.format(self.name))
+        stats.increment('sender.{0}.bytes'.format(self.name), len(body))
+        try:
+            return self.send_data(url, body, headers)
+        except urllib2.HTTPError, e:
+            if e.code != 415 or (encoding, compression) == (JSON, None):
+                raise
+            # Server does not understand the encoding, fall back to plain JSON
+            self.encoding_unsupported = True
+
+        body, headers = encode_payload(data)
+        stats.increment('sender.{0}.bytes'.format(self.name), len(body))
+        return self.send_data(url, body, headers)
+
+    def get_retry_budget(self):
+        # Without a budget given by the cycle, the sender has its own for the whole process
+        if self.retry_budget is None:
+            self.retry_budget = RetryBudget.from_config(self.config)
+        return self.retry_budget
+
+    def send_payload_retrying(self, url, data, deadline):
+        """
+        ``send_payload`` again after 429 and 503 responses, as long as the
+        retry budget lasts and the retry fits before ``deadline``.
+
+        """
+        attempt = 0
+        while True:
+            try:
+                return self.send_payload(url, data)
+            except urllib2.HTTPError, e:
+                if not is_retryable(e):
+                    raise
+                budget = self.get_retry_budget()
+                delay = budget.get_delay(e, attempt)
+                if time.time() + delay >= deadline or not budget.acquire(delay):
+                    raise
+
+            stats.increment('sender.{0}.retries'.format(self.name))
+            time.sleep(delay)
+            attempt += 1
+
+    def get_spool(self):
+        path = self.config.get('spool_dir', DEFAULT_SPOOL_DIR)
+        if not self.use_spool or not path:
+            return None
+        return Spool(path, max_size=int(self.config.get('spool_max_size', DEFAULT_MAX_SIZE)))
+
+    def send_or_spool(self, url, payloads):
+        """
+        Send payload objects, return list of responses.
+
+        Several payloads are sent concurrently, at most ``max_in_flight`` at
+        once. Payloads not delivered are written to the spool and the first
+        error is raised again. Payloads refused with 429 or 503 are retried
+        within the timeout of the sender, see ``send_payload_retrying``.
+
+        """
+        deadline = time.time() + self.get_timeout()
+        send = lambda payload: self.send_payload_retrying(url, payload, deadline).read()
+
+        if len(payloads) > 1 and self.get_max_in_flight() > 1:
+            outcomes = run_concurrently(send, payloads, self.get_max_in_flight())
+        else:
+            outcomes = []
+            for payload in payloads:
+                outcomes.append(capture(send, payload))
+                if outcomes[-1][1] is not None:
+                    break
+
+        result = []
+        undelivered = []
+        exc_info = None
+        for index, payload in enumerate(payloads):
+            if index < len(outcomes):
+                response, error = outcomes[index]
+                if error is None:
+                    result.append(response)
+                    continue
+                exc_info = exc_info or error
+            else:
+                # Payloads after a failed one were not even tried
+                error = exc_info
+            if is_delivery_error(error[1]):
+                undelivered.append(payload)
+
+        if exc_info is not None:
+            self.spool_payloads(url, undelivered)
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+        return result
+
+    def spool_payloads(self, url, payloads):
+        spool = self.get_spool()
+        if spool is None:
+            return
+        # Spool only the path, payloads go to the server configured at the time of replay
+        server_url = self.get_server_url()
+        if url.startswith(server_url):
+            url = url[len(server_url):]
+        try:
+            for payload in payloads:
+                spool.append(url, payload)
+        except EnvironmentError:
+            # Spool is not writable, the payloads are lost as without spool
+            pass
+
+    def replay_spool(self, batch_size=None, rate=None):
+        """
+        Send a batch of spooled payloads, return number of sent payloads.
+        ``batch_size`` and ``rate`` default to the configuration, ``rate``
+        0 sends the batch at once.
+
+        """
+        spool = self.get_spool()
+        if spool is None or not spool.get_segments():
+            return 0
+
+        def send(url, payload):
+            if url.startswith('/'):
+                url = '{0}{1}'.format(self.get_server_url(), url)
+            try:
+                self.send_payload(url, payload).read()
+            except urllib2.HTTPError, e:
+                # Payload rejected by the server would be rejected forever
+                if is_delivery_error(e):
+                    raise
+
+        if batch_size is None:
+            batch_size = int(self.config.get('spool_replay_batch', DEFAULT_BATCH_SIZE))
+        if rate is None:
+            rate = float(self.config.get('spool_replay_rate', DEFAULT_REPLAY_RATE))
+        return spool.replay(send, batch_size=batch_size, rate=rate)
+
 
 class BaseObjectSender(BaseSender):
 
     def send(self):
-        data = self.add_additional_data(self.get_data())
-        return self.send_data(self.get_url(), json.dumps(data)).read()
+        data = self.get_data()
+        if self.sampler is not None:
+            data.update(self.sampler.take(self.name))
+        data = self.add_additional_data(data)
+        self.last_data = data
+        return self.send_or_spool(self.get_url(), [data])[0]
 
 
 class BaseMultiObjectSender(BaseSender):
+    """
+    Sender of a list of objects.
+
+    With ``bulk_upload`` enabled in the configuration (or by default of the
+    sender) the objects are posted as JSON arrays of at most
+    ``bulk_batch_size`` objects to the bulk endpoint of the collection. When
+    the server does not provide the bulk endpoint, objects are posted one by
+    one.
+
+    """
+
+    bulk_upload = False
+    bulk_unsupported = False
+
+    def get_bulk_url(self):
+        return '{0}{1}'.format(self.get_url(), BULK_URL_SUFFIX)
+
+    def use_bulk_upload(self):
+        return bool(self.config.get('bulk_upload', self.bulk_upload)) and not self.bulk_unsupported
 
     def send(self):
         data = self.get_data()
-        url = self.get_url()
-        result = [self.send_data(url, json.dumps(item)).read() for item in data]
-        return result
+        self.last_data = data
+        if data and self.use_bulk_upload():
+            try:
+                return self.send_bulk(data)
+            except urllib2.HTTPError, e:
+                if e.code not in BULK_UNSUPPORTED_CODES:
+                    raise
+                self.bulk_unsupported = True
+
+        return self.send_items(data)
+
+    def send_items(self, data):
+        return self.send_or_spool(self.get_url(), data)
+
+    def send_bulk(self, data):
+        size = int(self.config.get('bulk_batch_size', DEFAULT_BULK_BATCH_SIZE))
+        batches = [data[i:i + size] for i in range(0, len(data), size)]
+        responses = self.send_or_spool(self.get_bulk_url(), batches)
+        # Keep the result in the same shape as a result of send_items
+        return [json.dumps(item) for response in responses for item in json.loads(response)]
 
 
 class MemorySender(BaseObjectSender):
     name = 'memory'
+    aggregated_fields = ('used', 'free', 'percent_used', 'swap_used', 'swap_free', 'swap_percent_used')
 
     def get_data(self):
-        return system_info_collector.get_memory_info()
+        return get_system_collector(self.config).get_memory_info()
 
 
 class LoadaAvgSender(BaseObjectSender):
     name = 'loadavg'
+    aggregated_fields = ('minute', 'five_minutes', 'fifteen_minutes')
 
     def get_data(self):
-        data = system_info_collector.get_load_average()
+        data = get_system_collector(self.config).get_load_average()
 
         return data
 
 
 class CPUSender(BaseObjectSender):
     name = 'cpu'
+    aggregated_fields = ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal')
+
+    _sample_state = None
 
     def get_data(self):
-        return system_info_collector.get_cpu_utilization()
+        return get_system_collector(self.config).get_cpu_utilization(get_state_store(self.config))
+
+    def sample(self):
+        # Samples cover the time since the previous sample, not since the previous report
+        collector = get_system_collector(self.config)
+        if self._sample_state is None:
+            self._sample_state = StateStore()
+            # The first reading covers the time since boot, it only starts the state
+            collector.get_cpu_utilization(self._sample_state)
+            return None
+        return collector.get_cpu_utilization(self._sample_state)
 
 
 class DiskUsageSender(BaseMultiObjectSender):
@@ -132,16 +414,12 @@ class DiskUsageSender(BaseMultiObjectSender):
 
     def get_data(self):
         path_list = self.config['path_list']
-        data = system_info_collector.get_disk_usage(path_list)
+        data = get_system_collector(self.config).get_disk_usage(path_list)
         result = []
-        for partition_name, partition_data in data.iteritems():
+        for partition_name, row in data.iteritems():
             if partition_name in self.config['disk']:
-                row = {
-                    'used': partition_data['used'],
-                    'free': partition_data['free'],
-                    'percent': partition_data['percent'],
-                    'disk': self.config['disk'][partition_name]
-                }
+                # Only used and free space and percent used of the record are sent
+                row.disk = self.config['disk'][partition_name]
                 result.append(self.add_additional_data(row))
         return result
 
@@ -155,12 +433,11 @@ class DiskIOSender(BaseMultiObjectSender):
     name = 'diskio'
 
     def get_data(self):
-        data = system_info_collector.get_disk_io()
+        data = get_system_collector(self.config).get_disk_io(get_state_store(self.config))
         result = []
-        for partition_name, partition_data in data.iteritems():
+        for partition_name, row in data.iteritems():
             if partition_name in self.config['disk']:
-                row = partition_data
-                row['disk'] = self.config['disk'][partition_name]
+                row.disk = self.config['disk'][partition_name]
                 result.append(self.add_additional_data(row))
 
         return result
@@ -175,15 +452,11 @@ class NetworkTrafficSender(BaseMultiObjectSender):
     name = 'networktraffic'
 
     def get_data(self):
-        raw_data = system_info_collector.get_network_traffic()
+        raw_data = get_system_collector(self.config).get_network_traffic(get_state_store(self.config))
         result = []
-        for device_name, device_data in raw_data.iteritems():
+        for device_name, row in raw_data.iteritems():
             if device_name in self.config['networkdevices']:
-                row = {
-                    'received': device_data['kb_received'],
-                    'transmitted': device_data['kb_transmitted'],
-                    'device': self.config['networkdevices'][device_name]
-                }
+                row.device = self.config['networkdevices'][device_name]
                 result.append(self.add_additional_data(row))
 
         return result
@@ -200,12 +473,66 @@ class NetworkTrafficSender(BaseMultiObjectSender):
         return params
 
 
+class CgroupSender(BaseMultiObjectSender):
+    """
+    Sender of CPU, memory and I/O usage of cgroups (containers, services),
+    posted in bulk.
+
+    """
+
+    name = 'cgroups'
+    bulk_upload = True
+
+    def get_data(self):
+        data = get_cgroup_collector(self.config).get_cgroups(get_state_store(self.config))
+        result = []
+        for name, values in sorted(data.iteritems()):
+            row = values
+            row['cgroup'] = name
+            result.append(self.add_additional_data(row))
+        return result
+
+
+class ProcessSender(BaseObjectSender):
+    """
+    Sender of the ``processes_top`` processes using most CPU and memory,
+    in one object.
+
+    """
+
+    name = 'processes'
+
+    def get_data(self):
+        top = int(self.config.get('processes_top', DEFAULT_PROCESSES_TOP))
+        return get_process_info_collector(self.config).get_top_processes(top)
+
+
+class SelfStatsSender(BaseObjectSender):
+    """
+    Sender of the measurements of the collector itself, see
+    ``simocollector.stats``.
+
+    """
+
+    name = 'selfstats'
+
+    def get_data(self):
+        return get_stats_summary(self.config)
+
+
+SENDERS = {
+    'cpu': CPUSender,
+    'loadavg': LoadaAvgSender,
+    'memory': MemorySender,
+    'diskusage': DiskUsageSender,
+    'diskio': DiskIOSender,
+    'networktraffic': NetworkTrafficSender,
+    'selfstats': SelfStatsSender,
+    'cgroups': CgroupSender,
+    'processes': ProcessSender,
+}
+
+
 def build_sender(name, config):
-    return {
-        'cpu': CPUSender(config),
-        'loadavg': LoadaAvgSender(config),
-        'memory': MemorySender(config),
-        'diskusage': DiskUsageSender(config),
-        'diskio': DiskIOSender(config),
-        'networktraffic': NetworkTrafficSender(config)
-    }[name]
+    # Only the requested sender is built (and its configuration validated)
+    return SENDERS[name](config)
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+__all__ = ['DEFAULT_SPOOL_DIR', 'Spool']
+
+import os
+import json
+import errno
+import time
+import fcntl
+
+from simocollector.records import dumps_json
+
+
+DEFAULT_SPOOL_DIR = '/var/spool/simo-collector'
+DEFAULT_MAX_SIZE = 50 * 1024 * 1024
+DEFAULT_SEGMENT_SIZE = 1024 * 1024
+DEFAULT_BATCH_SIZE = 100
+
+SEGMENT_SUFFIX = '.spool'
+CLAIM_SUFFIX = '.claimed'
+LOCK_FILENAME = '.lock'
+
+
+class Spool(object):
+    """
+    Append-only on-disk queue of payloads which could not be delivered.
+
+    Records are appended as JSON lines into segment files. Once the spool
+    grows over ``max_size`` the oldest segments are evicted. Changes of the
+    segments hold an exclusive lock, so that several collector processes may
+    share one spool directory. Segments being replayed are claimed (renamed)
+    by the replaying process, which sends them without holding the lock.
+    Records of evicted segments are passed to ``on_evict``.
+
+    """
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE, segment_size=DEFAULT_SEGMENT_SIZE, on_evict=None):
+        self.path = path
+        self.max_size = max_size
+        self.segment_size = min(segment_size, max_size)
+        self.on_evict = on_evict
+
+    def _lock(self):
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        lock = open(os.path.join(self.path, LOCK_FILENAME), 'a')
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def _segment_path(self, name):
+        return os.path.join(self.path, name)
+
+    def _new_segment_name(self):
+        timestamp = int(time.time() * 1000000)
+        while True:
+            name = '{0:020d}{1}'.format(timestamp, SEGMENT_SUFFIX)
+            if not os.path.exists(self._segment_path(name)):
+                return name
+            timestamp += 1
+
+    def get_segments(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name for name in os.listdir(self.path) if name.endswith(SEGMENT_SUFFIX))
+
+    def get_size(self):
+        return sum(os.path.getsize(self._segment_path(name)) for name in self.get_segments())
+
+    def append(self, url, data, timestamp=None):
+        # Payload may consist of records, which json does not know
+        record = '{{"ts": {0}, "url": {1}, "data": {2}}}\n'.format(
+            json.dumps(timestamp or time.time()), json.dumps(url), dumps_json(data))
+
+        lock = self._lock()
+        try:
+            segments = self.get_segments()
+            if segments and os.path.getsize(self._segment_path(segments[-1])) + len(record) <= self.segment_size:
+                name = segments[-1]
+            else:
+                name = self._new_segment_name()
+                segments.append(name)
+
+            with open(self._segment_path(name), 'a') as f:
+                f.write(record)
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._evict(segments)
+        finally:
+            lock.close()
+
+    def _evict(self, segments):
+        sizes = [os.path.getsize(self._segment_path(name)) for name in segments]
+        total = sum(sizes)
+        # Oldest data goes first, the segment being written to is always kept
+        while total > self.max_size and len(segments) > 1:
+            name = segments.pop(0)
+            if self.on_evict is not None:
+                self.on_evict(self._read_segment(name))
+            os.remove(self._segment_path(name))
+            total -= sizes.pop(0)
+
+    def _read_segment(self, name):
+        records = []
+        with open(self._segment_path(name), 'r') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Line torn by a crash during append
+                    pass
+        return records
+
+    def _claim_path(self, name):
+        return '{0}.{1}{2}'.format(self._segment_path(name), os.getpid(), CLAIM_SUFFIX)
+
+    def _release_abandoned_claims(self):
+        # Segments claimed by a process which died during replay are given back
+        for claim in os.listdir(self.path):
+            if not claim.endswith(CLAIM_SUFFIX):
+                continue
+            name, pid = claim[:-len(CLAIM_SUFFIX)].rsplit('.', 1)
+            try:
+                os.kill(int(pid), 0)
+            except OSError, e:
+                # EPERM is a process of another user, still alive
+                if e.errno == errno.ESRCH:
+                    os.rename(os.path.join(self.path, claim), self._segment_path(name))
+
+    def _claim(self, batch_size):
+        """
+        Claim the oldest segments holding at least ``batch_size`` records,
+        return their names and records.
+
+        """
+        lock = self._lock()
+        try:
+            self._release_abandoned_claims()
+            loaded = []
+            records = []
+            for name in self.get_segments():
+                records.extend(self._read_segment(name))
+                os.rename(self._segment_path(name), self._claim_path(name))
+                loaded.append(name)
+                if len(records) >= batch_size:
+                    break
+            return loaded, records
+        finally:
+            lock.close()
+
+    def replay(self, send, batch_size=DEFAULT_BATCH_SIZE, rate=None):
+        """
+        Send at most ``batch_size`` oldest records by ``send(url, data)``.
+
+        Records go out in timestamp order, at most ``rate`` records per
+        second. Replay stops on the first error of ``send``, records not
+        sent yet stay in the spool and the error is raised again.
+
+        Returns number of sent records.
+
+        """
+        loaded, records = self._claim(batch_size)
+        if not loaded:
+            return 0
+
+        records.sort(key=lambda r: r['ts'])
+
+        sent = 0
+        try:
+            for record in records[:batch_size]:
+                if sent and rate:
+                    time.sleep(1.0 / rate)
+                send(record['url'], record['data'])
+                sent += 1
+        finally:
+            lock = self._lock()
+            try:
+                self._rewrite(loaded, records[sent:])
+            finally:
+                lock.close()
+
+        return sent
+
+    def drain(self, send, batch_size=None):
+        """
+        Pass the oldest records, at least ``batch_size`` of them (all
+        without it), to ``send(records)`` at once. ``send`` returns the
+        records it did not send, which stay in the spool, the others are
+        removed from it. All of them stay when ``send`` raises.
+
+        Returns number of sent records.
+
+        """
+        loaded, records = self._claim(batch_size or float('inf'))
+        if not loaded:
+            return 0
+
+        records.sort(key=lambda r: r['ts'])
+
+        kept = records
+        try:
+            kept = send(records) or []
+        finally:
+            lock = self._lock()
+            try:
+                self._rewrite(loaded, kept)
+            finally:
+                lock.close()
+
+        return len(records) - len(kept)
+
+    def count(self, weight=None):
+        """
+        Number of records in the spool, including the ones being replayed,
+        or the sum of ``weight(record)`` of them.
+
+        """
+        lock = self._lock()
+        try:
+            self._release_abandoned_claims()
+            names = self.get_segments()
+            names.extend(name for name in os.listdir(self.path) if name.endswith(CLAIM_SUFFIX))
+            weight = weight or (lambda record: 1)
+            return sum(weight(record) for name in names for record in self._read_segment(name))
+        finally:
+            lock.close()
+
+    def _rewrite(self, loaded, records):
+        # Remaining records keep the name of the oldest segment, so they stay first in line
+        if records:
+            target = self._segment_path(loaded[0])
+            tmp = target + '.tmp'
+            with open(tmp, 'w') as f:
+                for record in records:
+                    f.write(json.dumps(record) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(tmp, target)
+
+        for name in loaded:
+            os.remove(self._claim_path(name))
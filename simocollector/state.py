@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+__all__ = ['DEFAULT_STATE_DIR', 'StateStore', 'get_state_store']
+
+import os
+import json
+
+
+DEFAULT_STATE_DIR = '/var/lib/simo-collector'
+
+
+class StateStore(object):
+    """
+    Previous readings of the collectors (counters, snapshots, ...).
+
+    Every key is kept in memory and in its own small JSON file, so one-shot
+    runs of different collection types never overwrite each other's state.
+    Without ``path`` the state lives in memory only.
+
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._data = {}
+
+    def _filename(self, key):
+        return os.path.join(self.path, '{0}.json'.format(key))
+
+    def get(self, key, default=None):
+        if key not in self._data and self.path:
+            try:
+                with open(self._filename(key), 'r') as f:
+                    self._data[key] = json.load(f)
+            except (EnvironmentError, ValueError):
+                return default
+
+        return self._data.get(key, default)
+
+    def set(self, key, value):
+        self._data[key] = value
+        if not self.path:
+            return
+
+        try:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+            filename = self._filename(key)
+            with open(filename + '.tmp', 'w') as f:
+                json.dump(value, f)
+            os.rename(filename + '.tmp', filename)
+        except EnvironmentError:
+            # State directory is not writable, the state is kept in memory only
+            pass
+
+
+_stores = {}
+
+
+def get_state_store(config):
+    """
+    Return state store of the configuration, one instance per directory,
+    so that a long-running process keeps its state in memory.
+
+    """
+    path = config.get('state_dir', DEFAULT_STATE_DIR)
+    if path not in _stores:
+        _stores[path] = StateStore(path)
+    return _stores[path]
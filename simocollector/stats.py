@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Measurements of the collector itself: durations of the collector calls and
+of the HTTP requests, bytes sent and errors.
+
+Counters and histograms are recorded in memory by ``stats``. ``flush``
+adds them to the stats file, so that one-shot runs and the daemon
+accumulate their totals in the same file. The file also keeps the values
+since the last report of ``selfstats``, which are what it reports.
+
+"""
+__all__ = ['DEFAULT_STATS_FILE', 'HISTOGRAM_BOUNDS', 'Histogram', 'Stats', 'stats', 'timed', 'summarize',
+           'flush_stats', 'get_stats_summary']
+
+import os
+import json
+import time
+import fcntl
+import functools
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+DEFAULT_STATS_FILE = '/var/lib/simo-collector/stats.json'
+
+# Upper bounds of histogram buckets (milliseconds), the last bucket is unbounded
+HISTOGRAM_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+
+class Histogram(object):
+    """
+    Counts of values in fixed buckets, mergeable across processes.
+
+    """
+
+    def __init__(self, bounds=HISTOGRAM_BOUNDS):
+        self.bounds = tuple(bounds)
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        if other.bounds != self.bounds:
+            raise Exception('Histograms with different buckets can not be merged.')
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        """
+        Upper bound of the bucket of the percentile (the maximum for the
+        last bucket).
+
+        """
+        rank = self.count * percent / 100.0
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return 0.0
+
+    def to_dict(self):
+        return {'bounds': list(self.bounds), 'buckets': self.buckets, 'count': self.count,
+                'sum': self.sum, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data['bounds'])
+        histogram.buckets = list(data['buckets'])
+        histogram.count = data['count']
+        histogram.sum = data['sum']
+        histogram.max = data['max']
+        return histogram
+
+
+class Stats(object):
+    """
+    Thread-safe registry of counters and histograms.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {}
+        self.histograms = {}
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name):
+        """
+        Record duration (milliseconds) of the block in histogram ``name``,
+        and count errors raised by it in ``<name>.errors``.
+
+        """
+        started = time.time()
+        try:
+            yield
+        except Exception:
+            self.increment('{0}.errors'.format(name))
+            raise
+        finally:
+            self.observe(name, (time.time() - started) * 1000)
+
+    def snapshot(self, reset=False):
+        """
+        Return ``{'started': .., 'counters': .., 'histograms': ..}``, with
+        ``reset`` start recording from zero again.
+
+        """
+        with self._lock:
+            data = {
+                'started': self.started,
+                'counters': dict(self.counters),
+                'histograms': dict((name, h.to_dict()) for name, h in self.histograms.iteritems()),
+            }
+            if reset:
+                self.started = time.time()
+                self.counters = {}
+                self.histograms = {}
+        return data
+
+    def flush(self, path, take_window=False):
+        """
+        Add the recorded values to the stats file at ``path`` and start
+        recording from zero. The file holds the totals, and in ``window``
+        the values since the window was taken last. Return the totals, with
+        ``take_window`` the window, which starts from zero again.
+
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        lock = open(path + '.lock', 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(path, 'r') as f:
+                    totals = json.load(f)
+            except (EnvironmentError, ValueError):
+                totals = None
+
+            data = self.snapshot(reset=True)
+            window = totals.get('window') if totals else None
+            # A copy, the window is stored in ``data``
+            window = merge_snapshots(window, data) if window else dict(data)
+            if totals:
+                data = merge_snapshots(totals, data)
+
+            result = data
+            if take_window:
+                result = window
+                window = {'started': time.time(), 'counters': {}, 'histograms': {}}
+            data['window'] = window
+            data['updated'] = time.time()
+
+            with open(path + '.tmp', 'w') as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            os.rename(path + '.tmp', path)
+            return result
+        finally:
+            lock.close()
+
+
+def merge_snapshots(first, second):
+    counters = dict(first['counters'])
+    for name, value in second['counters'].iteritems():
+        counters[name] = counters.get(name, 0) + value
+
+    histograms = dict(first['histograms'])
+    for name, data in second['histograms'].iteritems():
+        if name in histograms:
+            histogram = Histogram.from_dict(histograms[name])
+            histogram.merge(Histogram.from_dict(data))
+            data = histogram.to_dict()
+        histograms[name] = data
+
+    return {'started': min(first['started'], second['started']), 'counters': counters, 'histograms': histograms}
+
+
+def summarize(snapshot):
+    """
+    Flat dict of the counters, and count, mean, 95th percentile and maximum
+    of every histogram.
+
+    """
+    data = dict(snapshot['counters'])
+    for name, histogram in snapshot['histograms'].iteritems():
+        histogram = Histogram.from_dict(histogram)
+        data['{0}.count'.format(name)] = histogram.count
+        data['{0}.mean_ms'.format(name)] = round(histogram.sum / histogram.count, 2) if histogram.count else 0.0
+        data['{0}.p95_ms'.format(name)] = round(histogram.percentile(95), 2)
+        data['{0}.max_ms'.format(name)] = round(histogram.max, 2)
+    return data
+
+
+stats = Stats()
+
+
+def timed(name):
+    """
+    Decorator recording durations of the calls in histogram ``name``.
+
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stats.timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def flush_stats(config, take_window=False):
+    """
+    Flush ``stats`` to the ``stats_file`` of the configuration, return the
+    totals of the file, or its window (``None`` when it is disabled or not
+    writable).
+
+    """
+    path = config.get('stats_file', DEFAULT_STATS_FILE)
+    if not path:
+        return None
+    try:
+        return stats.flush(path, take_window)
+    except EnvironmentError:
+        # Stats file is not writable, the values are lost
+        return None
+
+
+def get_stats_summary(config):
+    """
+    Summary of the values since the previous summary, kept in the stats
+    file, or in this process without the file.
+
+    """
+    window = flush_stats(config, take_window=True)
+    if window is None:
+        window = stats.snapshot(reset=True)
+    return summarize(window)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+In-process history of samples.
+
+Every series is a fixed-capacity ring buffer with one typed array per field
+(plus one of timestamps), allocated up front. Appending a sample only writes
+into the arrays, so the memory used by the history is known in advance and
+does not grow with the number of samples. Samples are timestamped by
+``simocollector.utils.monotonic``, so windows are not broken by steps of the
+wall clock.
+
+"""
+__all__ = ['RingBuffer', 'TimeSeriesStore']
+
+from array import array
+
+from simocollector.utils import monotonic, percentile
+
+
+class RingBuffer(object):
+    """
+    Last ``capacity`` samples of ``fields``, stored in arrays of ``typecode``.
+
+    """
+
+    def __init__(self, fields, capacity, typecode='d'):
+        if capacity < 1:
+            raise Exception('Capacity of a time series must be positive.')
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self._times = array('d', [0.0]) * capacity
+        self._columns = dict((field, array(typecode, [0]) * capacity) for field in self.fields)
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, sample, timestamp=None):
+        """
+        Append ``sample`` (mapping of the fields to numbers). Timestamps are
+        ``monotonic`` by default, and expected not to go backwards. The
+        oldest sample is overwritten when the buffer is full.
+
+        """
+        position = self._next
+        self._times[position] = timestamp if timestamp is not None else monotonic()
+        for field, column in self._columns.iteritems():
+            column[position] = sample[field]
+
+        self._next = (position + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def _position(self, index):
+        # Index 0 is the oldest sample
+        return (self._next - self._count + index) % self.capacity
+
+    def _bisect(self, timestamp):
+        # Index of the first sample not older than timestamp
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._times[self._position(middle)] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _range(self, start, end):
+        first = self._bisect(start) if start is not None else 0
+        last = self._bisect(end) if end is not None else self._count
+        return first, last
+
+    def window(self, field, start=None, end=None):
+        """
+        Return array of values of ``field`` sampled in ``[start, end)``,
+        oldest first.
+
+        """
+        first, last = self._range(start, end)
+        column = self._columns[field]
+        result = array(column.typecode)
+        begin = self._position(first)
+        length = last - first
+        if begin + length <= self.capacity:
+            result.extend(column[begin:begin + length])
+        else:
+            result.extend(column[begin:])
+            result.extend(column[:begin + length - self.capacity])
+        return result
+
+    def aggregate(self, start=None, end=None):
+        """
+        Return ``{'<field>_min': .., '<field>_max': .., '<field>_mean': ..,
+        '<field>_p95': ..}`` of samples in ``[start, end)``. Returns an empty
+        dict when there is no such sample.
+
+        """
+        result = {}
+        for field in self.fields:
+            values = self.window(field, start, end)
+            if not values:
+                continue
+            result['{0}_min'.format(field)] = min(values)
+            result['{0}_max'.format(field)] = max(values)
+            result['{0}_mean'.format(field)] = round(float(sum(values)) / len(values), 2)
+            result['{0}_p95'.format(field)] = round(percentile(values, 95), 2)
+        return result
+
+
+class TimeSeriesStore(object):
+    """
+    Ring buffers of metric (or metric and device) series, created on the
+    first sample of the series.
+
+    """
+
+    def __init__(self, capacity, typecode='d'):
+        self.capacity = capacity
+        self.typecode = typecode
+        self._series = {}
+
+    def get(self, key):
+        return self._series.get(key)
+
+    def append(self, key, sample, fields=None, timestamp=None):
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = RingBuffer(fields or sorted(sample), self.capacity, self.typecode)
+        series.append(sample, timestamp)
+
+    def aggregate(self, key, start=None, end=None):
+        series = self._series.get(key)
+        if series is None:
+            return {}
+        return series.aggregate(start, end)
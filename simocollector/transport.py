@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+__all__ = ['DEFAULT_TIMEOUT', 'ConnectionPool', 'connection_pool']
+
+import httplib
+import socket
+import threading
+import urllib
+import urllib2
+import urlparse
+from StringIO import StringIO
+
+
+DEFAULT_TIMEOUT = 30
+
+CONNECTION_CLASSES = {
+    'http': httplib.HTTPConnection,
+    'https': httplib.HTTPSConnection,
+}
+
+
+def is_stale_connection_error(e, sent):
+    """
+    Whether error ``e`` of a request on a reused connection means that the
+    server had closed the connection before it could process the request:
+    the request could not be written (``sent`` false), or the connection was
+    closed without any response. Timeouts are not, the server may still be
+    processing the request.
+
+    """
+    if isinstance(e, socket.timeout):
+        return False
+    if not sent:
+        return isinstance(e, socket.error)
+    return isinstance(e, httplib.BadStatusLine)
+
+
+class ConnectionPool(object):
+    """
+    Pool of persistent (keep-alive) HTTP connections, kept per server.
+
+    Responses are read whole, so a connection goes back to the pool as soon
+    as the request is done. Returned responses and raised errors are the same
+    as the ones of ``urllib2.urlopen``.
+
+    """
+
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._in_flight = None
+
+    def limit_in_flight(self, count):
+        """
+        Allow at most ``count`` concurrent requests, ``None`` for no limit.
+
+        """
+        self._in_flight = threading.BoundedSemaphore(count) if count else None
+
+    def _connect(self, key, timeout):
+        scheme, host, port = key
+        return CONNECTION_CLASSES[scheme](host, port, timeout=timeout)
+
+    def _acquire(self, key, timeout):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(key, timeout), False
+
+    def _release(self, key, connection):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.maxsize:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def clear(self):
+        with self._lock:
+            connections = [c for idle in self._idle.itervalues() for c in idle]
+            self._idle = {}
+        for connection in connections:
+            connection.close()
+
+    def request(self, method, url, data=None, headers=None, timeout=DEFAULT_TIMEOUT):
+        in_flight = self._in_flight
+        if in_flight is None:
+            return self._request(method, url, data, headers, timeout)
+
+        in_flight.acquire()
+        try:
+            return self._request(method, url, data, headers, timeout)
+        finally:
+            in_flight.release()
+
+    def _request(self, method, url, data, headers, timeout):
+        parts = urlparse.urlsplit(url)
+        if parts.scheme not in CONNECTION_CLASSES:
+            raise urllib2.URLError('unknown url type: {0}'.format(parts.scheme))
+
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path = '{0}?{1}'.format(path, parts.query)
+
+        connection, reused = self._acquire(key, timeout)
+        while True:
+            sent = False
+            try:
+                if connection.sock is not None:
+                    connection.sock.settimeout(timeout)
+                connection.request(method, path, data, headers or {})
+                sent = True
+                response = connection.getresponse()
+                body = response.read()
+            except (httplib.HTTPException, socket.error), e:
+                connection.close()
+                if reused and is_stale_connection_error(e, sent):
+                    # Server closed the idle keep-alive connection before reading the request,
+                    # try once more on a new connection
+                    connection, reused = self._connect(key, timeout), False
+                    continue
+                raise urllib2.URLError(e)
+            break
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(key, connection)
+
+        if not 200 <= response.status < 300:
+            raise urllib2.HTTPError(url, response.status, response.reason, response.msg, StringIO(body))
+
+        return urllib.addinfourl(StringIO(body), response.msg, url, response.status)
+
+    def urlopen(self, url, data, headers, timeout=DEFAULT_TIMEOUT):
+        scheme = urlparse.urlsplit(url).scheme
+        if scheme in urllib.getproxies():
+            # Proxies are left to urllib2, which knows how to talk to them
+            request = urllib2.Request(url, None, headers=headers)
+            return urllib2.urlopen(request, data=data, timeout=timeout)
+
+        return self.request('POST' if data is not None else 'GET', url, data, headers, timeout)
+
+
+connection_pool = ConnectionPool()
@@ -1,3 +1,4 @@
+import os
 import subprocess
 import sys
 import calendar
@@ -40,6 +41,54 @@ def get_network_interfaces():
     return interfaces_list
 
 
+def counter_delta(current, previous):
+    """
+    Difference between two readings of a monotonic counter.
+
+    Counters kept by the kernel in 32 or 64 bits wrap around. A wrapped
+    delta bigger than a half of the counter range is a reset of the counter
+    (device reattached) rather than a wrap, then the current value is the
+    delta.
+
+    """
+    if current >= previous:
+        return current - previous
+
+    for bits in (32, 64):
+        modulus = 2 ** bits
+        if previous < modulus:
+            delta = current + modulus - previous
+            if delta < modulus / 2:
+                return delta
+            break
+
+    return current
+
+
+def monotonic():
+    """
+    Seconds since an arbitrary point in the past, not affected by changes of
+    the wall clock (clock ticks since boot on Linux, in hundredths of a
+    second).
+
+    """
+    return os.times()[4]
+
+
+def percentile(values, percent):
+    """
+    Percentile of ``values`` with linear interpolation between the closest ranks.
+
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = (len(values) - 1) * percent / 100.0
+    lower = int(index)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (index - lower)
+
+
 # Used in the collector, saves all the data in UTC
 def unix_utc_now():
     d = datetime.utcnow()
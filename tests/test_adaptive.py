@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from simocollector.adaptive import AdaptiveScheduler
+from simocollector.daemon import Job
+from simocollector.records import DiskIORecord, NetworkTrafficRecord, MemoryRecord
+
+
+def diskio(reads, delta):
+    row = DiskIORecord(reads, 2000, 80000, 160000, 300, 600)
+    row.read_count_delta = delta
+    row.read_count_per_sec = delta / 600.0
+    row.disk = 'http://simo/api/disk/1/'
+    return [row]
+
+
+def networktraffic(received, delta):
+    row = NetworkTrafficRecord(received, 500000)
+    row.received_delta = delta
+    row.received_per_sec = delta / 360.0
+    row.device = 'http://simo/api/network-device/1/'
+    return [row]
+
+
+class AdaptiveSchedulerTest(unittest.TestCase):
+
+    def test_quiet_host_keeps_configured_intervals(self):
+        jobs = [Job('diskio', None, 600), Job('networktraffic', None, 360), Job('memory', None, 540)]
+        scheduler = AdaptiveScheduler(jobs, {})
+
+        # A few reads and packets, the deltas jump between 0 and a few per report
+        for i, delta in enumerate([0, 3, 0, 5, 1, 0, 4]):
+            scheduler.adapt(jobs[0], diskio(1000 + i * 3, delta))
+            scheduler.adapt(jobs[1], networktraffic(100000 + i * 4, delta))
+            scheduler.adapt(jobs[2], MemoryRecord(2048, 1024 - delta, 1024 + delta, 50, 1024, 0, 1024, 0))
+
+        self.assertEqual([job.interval for job in jobs], [600, 360, 540])
+
+    def test_busy_values_shorten_interval(self):
+        job = Job('memory', None, 540)
+        scheduler = AdaptiveScheduler([job], {})
+        scheduler.adapt(job, MemoryRecord(2048, 1500, 548, 26, 1024, 0, 1024, 0))
+        scheduler.adapt(job, MemoryRecord(2048, 100, 1948, 95, 1024, 0, 1024, 0))
+
+        self.assertEqual(job.interval, 270)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from simocollector.backoff import ONE_SHOT_JITTER_SHARE, get_jitter, get_one_shot_jitter
+
+
+class JitterTest(unittest.TestCase):
+
+    def test_jitter_is_stable_and_bounded(self):
+        for host in ('web1', 'web2', 'db1', 'db2'):
+            config = {'server_id': 'http://simo/api/server/{0}/'.format(host)}
+            jitter = get_jitter(config, 'loadavg', 120)
+            self.assertEqual(jitter, get_jitter(config, 'loadavg', 120))
+            self.assertTrue(0 <= jitter < 60)
+            self.assertTrue(0 <= get_jitter(config, 'loadavg', 120, ONE_SHOT_JITTER_SHARE) < 30)
+            self.assertTrue(0 <= get_jitter(config, 'cpu', 3600) < 60)
+
+    def test_jitter_can_be_disabled(self):
+        self.assertEqual(get_jitter({'server_id': 'x', 'send_jitter': 0}, 'loadavg', 120), 0)
+
+    def test_one_shot_jitter_fits_the_shortest_interval(self):
+        for host in ('web1', 'web2', 'db1', 'db2'):
+            config = {'server_id': 'http://simo/api/server/{0}/'.format(host)}
+            self.assertTrue(0 <= get_one_shot_jitter(config, ['loadavg', 'diskusage']) < 30)
+            config['intervals'] = {'diskusage': 60}
+            self.assertTrue(0 <= get_one_shot_jitter(config, ['diskusage']) < 15)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from simocollector.cgroups import CgroupScanner
+from simocollector.collectors import CgroupCollector
+from simocollector.state import StateStore
+
+
+class CgroupScannerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.set_descendants(0)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def set_descendants(self, count):
+        with open(os.path.join(self.root, 'cgroup.stat'), 'w') as f:
+            f.write('nr_descendants {0}\nnr_dying_descendants 0\n'.format(count))
+
+    def add_cgroup(self, name, usage_usec=1000):
+        path = os.path.join(self.root, name)
+        os.makedirs(path)
+        with open(os.path.join(path, 'cpu.stat'), 'w') as f:
+            f.write('usage_usec {0}\nuser_usec 0\nsystem_usec 0\n'.format(usage_usec))
+
+    def test_replaced_cgroup_is_found(self):
+        scanner = CgroupScanner(self.root)
+        self.add_cgroup('a.slice')
+        self.set_descendants(1)
+        self.assertEqual(sorted(scanner.scan()), ['a.slice'])
+
+        # One cgroup removed and another created, the number of descendants stays the same
+        shutil.rmtree(os.path.join(self.root, 'a.slice'))
+        self.add_cgroup('b.slice')
+        os.utime(self.root, (0, 0))
+        self.assertEqual(sorted(scanner.scan()), ['b.slice'])
+
+    def test_hierarchy_is_walked_again_periodically(self):
+        scanner = CgroupScanner(self.root, rescan_every=2)
+        os.utime(self.root, (1000, 1000))
+        scanner.scan()
+        self.add_cgroup('a.slice')
+        # A change not seen by the other checks
+        os.utime(self.root, (1000, 1000))
+
+        self.assertEqual(scanner.scan(), {})
+        self.assertEqual(sorted(scanner.scan()), ['a.slice'])
+
+    def test_new_cgroup_has_no_rates(self):
+        collector = CgroupCollector(CgroupScanner(self.root))
+        state = StateStore()
+        self.add_cgroup('a.slice')
+        self.set_descendants(1)
+        collector.get_cgroups(state)
+        self.add_cgroup('b.slice')
+        self.set_descendants(2)
+        data = collector.get_cgroups(state)
+
+        self.assertEqual(data['a.slice']['cpu_usage_usec_delta'], 0)
+        self.assertFalse('cpu_usage_usec_per_sec' in data['b.slice'])
+
+
+if __name__ == '__main__':
+    unittest.main()
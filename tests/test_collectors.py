@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import sys
+import unittest
+import subprocess
+
+from simocollector.collectors import SystemCollector
+from simocollector.state import StateStore
+
+
+class FakeBackend(object):
+    root = '/nonexistent'
+
+    def __init__(self):
+        self.uptime = 1000.0
+        self.disks = {}
+        self.devices = {}
+
+    def uptime_seconds(self):
+        return self.uptime
+
+    def disk_io_counters(self):
+        return dict((name, {'read_count': reads, 'write_count': 0, 'read_bytes': reads * 4096, 'write_bytes': 0,
+                            'read_time': 0, 'write_time': 0})
+                    for name, reads in self.disks.iteritems())
+
+    def net_io_counters(self):
+        return self.devices
+
+
+class CounterChangesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = FakeBackend()
+        self.collector = SystemCollector(self.backend)
+        self.state = StateStore()
+
+    def test_first_sample_has_no_changes(self):
+        self.backend.disks = {'sda': 100}
+        row = self.collector.get_disk_io(self.state)['sda']
+        self.assertFalse('read_count_delta' in row)
+        self.assertFalse('read_kb_per_sec' in row)
+
+    def test_new_device_has_no_changes(self):
+        self.backend.devices = {'eth0': (1024, 2048)}
+        self.collector.get_network_traffic(self.state)
+        self.backend.devices = {'eth0': (3072, 4096), 'eth1': (10240, 10240)}
+        data = self.collector.get_network_traffic(self.state)
+
+        self.assertEqual(data['eth0']['received_delta'], 2)
+        self.assertEqual(data['eth0']['transmitted_delta'], 2)
+        self.assertFalse('received_delta' in data['eth1'])
+
+    def test_byte_counters_are_sent_in_kb(self):
+        self.backend.disks = {'sda': 100}
+        self.collector.get_disk_io(self.state)
+        self.backend.disks = {'sda': 150}
+        row = self.collector.get_disk_io(self.state)['sda']
+
+        self.assertEqual(row['read_count_delta'], 50)
+        self.assertEqual(row['read_kb_delta'], 200)
+        self.assertEqual(row['read_kb'], 600)
+
+    def test_changes_after_reboot_are_since_boot(self):
+        self.backend.disks = {'sda': 100}
+        self.collector.get_disk_io(self.state)
+        self.backend.uptime = 10.0
+        self.backend.disks = {'sda': 20}
+        row = self.collector.get_disk_io(self.state)['sda']
+
+        self.assertEqual(row['read_count_delta'], 20)
+        self.assertEqual(row['read_count_per_sec'], 2.0)
+
+
+class PsutilBackendTest(unittest.TestCase):
+
+    def test_load_average_does_not_import_psutil(self):
+        # In a new interpreter, other tests may have imported psutil already
+        output = subprocess.check_output([sys.executable, '-c', (
+            'import sys\n'
+            'from simocollector.collectors import system_info_collector\n'
+            'assert system_info_collector.get_load_average()["cores"] > 0\n'
+            'print("psutil" in sys.modules)\n')])
+        self.assertEqual(output.strip(), 'False')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import time
+import shutil
+import tempfile
+import unittest
+
+from simocollector.benchmarks import build_config
+from simocollector.daemon import Daemon
+from simocollector.mockserver import MockSimoServer
+from simocollector.sender import URL_LIST
+
+
+class DaemonReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.simo = MockSimoServer().start()
+        self.work_dir = tempfile.mkdtemp()
+        self.config = build_config(self.simo.url, self.work_dir)
+        self.config.update({'stats_file': None, 'spool_replay_rate': 10})
+        self.daemon = Daemon(self.config, ['loadavg'])
+        spool = self.daemon.jobs[0].sender.get_spool()
+        for i in range(25):
+            spool.append(URL_LIST['loadavg'], {'minute': i})
+
+    def tearDown(self):
+        self.daemon.dispatcher.close()
+        self.simo.stop()
+        shutil.rmtree(self.work_dir)
+
+    def test_replay_is_spread_across_ticks(self):
+        started = time.time()
+        self.daemon.run_pending()
+        self.assertTrue(time.time() - started < 0.5)
+        # The collection and one tick of the spool
+        self.assertEqual(len(self.simo.get_received('loadavg')), 11)
+        self.assertTrue(0 < self.daemon.get_sleep_time() <= 1)
+
+        for i in range(3):
+            self.daemon.next_replay = 0
+            self.daemon.run_pending()
+        self.assertEqual(len(self.simo.get_received('loadavg')), 26)
+        self.assertTrue(self.daemon.replay_job is None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+import unittest
+
+from simocollector.dispatch import Dispatcher, run_concurrently
+
+
+class SlowSender(object):
+    name = 'slow'
+
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+
+    def get_timeout(self):
+        return 0.1
+
+    def send(self):
+        self.calls += 1
+        self.release.wait()
+        return 'sent'
+
+
+class DispatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatcher = Dispatcher(2)
+
+    def tearDown(self):
+        self.dispatcher.close()
+
+    def test_sender_past_deadline_is_not_dispatched_again(self):
+        sender = SlowSender()
+        (result, ) = self.dispatcher.dispatch([sender])
+        self.assertTrue(result[2] is not None)
+
+        (result, ) = self.dispatcher.dispatch([sender])
+        self.assertTrue('still running' in str(result[2][1]))
+        self.assertEqual(sender.calls, 1)
+
+        sender.release.set()
+        time.sleep(0.05)
+        (result, ) = self.dispatcher.dispatch([sender])
+        self.assertEqual(result[1:], ('sent', None))
+        self.assertEqual(sender.calls, 2)
+
+
+class RunConcurrentlyTest(unittest.TestCase):
+
+    def test_results_in_order_and_no_threads_left(self):
+        threads = threading.active_count()
+
+        def double(value):
+            if value == 3:
+                raise ValueError(value)
+            return value * 2
+
+        results = run_concurrently(double, range(6), 4)
+        self.assertEqual([r[0] for r in results], [0, 2, 4, None, 8, 10])
+        self.assertTrue(isinstance(results[3][1][1], ValueError))
+        self.assertEqual(threading.active_count(), threads)
+
+
+if __name__ == '__main__':
+    unittest.main()
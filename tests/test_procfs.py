@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from simocollector.procfs import ProcessScanner
+
+
+class ProcessScannerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.scanner = ProcessScanner(self.root)
+        self.clock_ticks = int(self.scanner.clock_ticks)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def set_uptime(self, seconds):
+        with open(os.path.join(self.root, 'uptime'), 'w') as f:
+            f.write('{0:.2f} 0.00\n'.format(seconds))
+
+    def set_process(self, pid, command, cpu_seconds, flags=0, start_seconds=0):
+        path = os.path.join(self.root, str(pid))
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        ticks = cpu_seconds * self.clock_ticks
+        fields = ['S', '1', '1', '1', '0', '-1', str(flags), '0', '0', '0', '0', str(ticks), '0', '0', '0', '20',
+                  '0', '1', '0', str(start_seconds * self.clock_ticks)] + ['0'] * 32
+        with open(os.path.join(path, 'stat'), 'w') as f:
+            f.write('{0} ({1}) {2}\n'.format(pid, command, ' '.join(fields)))
+        with open(os.path.join(path, 'statm'), 'w') as f:
+            f.write('1000 250 100 1 0 200 0\n')
+
+    def get_cpu(self):
+        return dict((pid, round(cpu, 1)) for pid, command, cpu, rss in self.scanner.scan())
+
+    def test_cpu_since_previous_scan(self):
+        self.set_uptime(100)
+        self.set_process(1, 'init', 10)
+        self.set_process(2, 'cron job', 0, start_seconds=90)
+        self.assertEqual(self.get_cpu(), {1: 10.0, 2: 0.0})
+
+        self.set_uptime(110)
+        self.set_process(1, 'init', 15)
+        self.set_process(2, 'cron job', 5, start_seconds=90)
+        self.assertEqual(self.get_cpu(), {1: 50.0, 2: 50.0})
+
+    def test_stopped_scan_keeps_previous_state(self):
+        self.set_uptime(100)
+        self.set_process(1, 'init', 10)
+        self.set_process(2, 'sshd', 10)
+        self.scanner.scan()
+
+        self.set_uptime(110)
+        self.set_process(1, 'init', 15)
+        self.set_process(2, 'sshd', 15)
+        scan = self.scanner.iter_scan()
+        scan.next()
+        scan.close()
+
+        self.set_uptime(120)
+        self.set_process(1, 'init', 20)
+        self.set_process(2, 'sshd', 20)
+        self.assertEqual(self.get_cpu(), {1: 50.0, 2: 50.0})
+
+    def test_kernel_threads_are_skipped(self):
+        self.set_uptime(100)
+        self.set_process(1, 'init', 1)
+        self.set_process(2, 'kthreadd', 1, flags=0x00208040)
+        self.set_process(3, 'php_fpm', 1)
+        self.assertEqual(sorted(self.get_cpu()), [1, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+from collections import OrderedDict
+
+from simocollector.encoding import dumps_binary, loads_binary
+from simocollector.records import (Record, MemoryRecord, LoadAverageRecord, CPURecord, DiskUsageRecord,
+                                   DiskIORecord, NetworkTrafficRecord, dumps_json)
+
+
+def build_records():
+    disk_io = DiskIORecord(120, 340, 4096, 8192, 15, 30)
+    disk_io.read_count_delta = 12
+    disk_io.read_count_per_sec = 0.02
+    disk_io.disk = u'http://simo/api/disk/1/'
+
+    network = NetworkTrafficRecord(1024 ** 3, 3)
+    network.received_delta = 0
+    network.received_per_sec = 1.5
+    network.device = 'http://simo/api/network-device/"eth0"/'
+
+    cpu = CPURecord(12.5, 0.0, 3.1, 84.4, 0.0, 0.0, 0.0, 0.0)
+    # Aggregates of the sampler are kept out of the fields
+    cpu['user_max'] = 50.0
+
+    return [
+        MemoryRecord(7986, 1024, 6962, 87, 2047, 0, 2047, 0),
+        LoadAverageRecord(0.52, 0.4, 0.31, 4),
+        cpu,
+        CPURecord(12.5, 0.0, 3.1, 84.4, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0),
+        DiskUsageRecord(102400, 51200, 51200, 50, '/dev/sda1', u'/srv/d\xe1ta'),
+        disk_io,
+        network,
+    ]
+
+
+class RecordTest(unittest.TestCase):
+
+    def test_every_record_class_is_covered(self):
+        covered = set(type(record) for record in build_records())
+        self.assertEqual(covered, set(Record.__subclasses__()))
+
+    def test_to_json_is_json_dumps_of_to_dict(self):
+        for record in build_records():
+            for created in (None, 1792325334):
+                if created is not None:
+                    record.created = created
+                    record.server = 'http://simo/api/server/1/'
+                # Same keys in the same order give the same bytes on the wire
+                self.assertEqual(record.to_json(), json.dumps(OrderedDict(record.iteritems())))
+                self.assertEqual(json.loads(record.to_json()), record.to_dict())
+
+    def test_internal_fields_are_not_sent(self):
+        record = DiskUsageRecord(102400, 51200, 51200, 50, '/dev/sda1', '/')
+        self.assertEqual(record.to_dict(), {'used': 51200, 'free': 51200, 'percent': 50})
+
+    def test_non_finite_floats_are_null(self):
+        def reject(constant):
+            raise ValueError(constant)
+
+        record = LoadAverageRecord(float('nan'), float('inf'), 0.31, 4)
+        record.created = 1792325334
+        record.server = 'http://simo/api/server/1/'
+        sampled = LoadAverageRecord(float('-inf'), 0.4, 0.31, 4)
+        sampled['minute_max'] = float('nan')
+        for record in (record, sampled):
+            data = json.loads(record.to_json(), parse_constant=reject)
+            self.assertEqual(data['minute'], None)
+            self.assertEqual(data['fifteen_minutes'], 0.31)
+
+    def test_records_in_containers(self):
+        records = build_records()
+        payloads = [
+            records,
+            {'eth0': records[-1], 'sda': records[-2]},
+            [{'a': 1}, records[0]],
+            [records[0], {'a': 1}],
+            {'rows': records, 'count': len(records)},
+        ]
+        for payload in payloads:
+            expected = json.loads(json.dumps(payload, default=lambda record: record.to_dict()))
+            self.assertEqual(json.loads(dumps_json(payload)), expected)
+            self.assertEqual(loads_binary(dumps_binary(payload)), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
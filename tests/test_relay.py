@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+import unittest
+
+from simocollector.benchmarks import build_config
+from simocollector.mockserver import MockSimoServer
+from simocollector.relay import Relay
+from simocollector.sender import build_sender
+
+
+class RelayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.simo = MockSimoServer().start()
+        self.work_dir = tempfile.mkdtemp()
+        self.config = build_config(self.simo.url, self.work_dir)
+        self.config.update({'stats_file': None, 'relay_flush_interval': 3600})
+
+    def tearDown(self):
+        self.simo.stop()
+        shutil.rmtree(self.work_dir)
+
+    def test_acknowledged_objects_survive_restart(self):
+        relay = Relay(dict(self.config), host='127.0.0.1', port=0).start()
+        collector_config = dict(self.config, server=relay.url)
+        build_sender('memory', collector_config).send()
+        build_sender('loadavg', collector_config).send()
+
+        # Relay goes down without forwarding anything
+        relay.httpd.shutdown()
+        relay.httpd.server_close()
+        relay.httpd.close_connections()
+        self.assertEqual(self.simo.received, [])
+
+        restarted = Relay(dict(self.config), host='127.0.0.1', port=0)
+        self.assertEqual(restarted._pending_count, 2)
+        restarted.flush()
+
+        self.assertEqual(len(self.simo.get_received('memory')), 1)
+        self.assertEqual(len(self.simo.get_received('loadavg')), 1)
+        self.assertEqual(restarted._pending_count, 0)
+        self.assertEqual(restarted.queue.count(), 0)
+        restarted.dispatcher.close()
+        relay.close()
+
+    def test_objects_of_senders_not_run_stay_queued(self):
+        relay = Relay(dict(self.config), host='127.0.0.1', port=0)
+        relay.put('memory', [{'used': 1}])
+        relay.put('loadavg', [{'minute': 1.0}])
+        # Memory sender does not get to take its objects
+        relay.senders['memory'].send = lambda: None
+        relay.flush()
+
+        self.assertEqual(len(self.simo.get_received('loadavg')), 1)
+        self.assertEqual(self.simo.get_received('memory'), [])
+        self.assertEqual(relay.queue.count(), 1)
+        self.assertEqual(relay._pending_count, 1)
+
+        del relay.senders['memory'].send
+        relay.close()
+        self.assertEqual(len(self.simo.get_received('memory')), 1)
+        self.assertEqual(relay.queue.count(), 0)
+
+    def test_evicted_objects_are_not_counted(self):
+        relay = Relay(dict(self.config, relay_queue_max_size=1024), host='127.0.0.1', port=0)
+        for i in range(50):
+            relay.put('memory', [{'used': i}, {'used': i}])
+
+        self.assertTrue(relay._pending_count < 100)
+        self.assertEqual(relay._pending_count, relay.queue.count(lambda record: len(record['data'])))
+        relay.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from simocollector.sampling import Sampler
+from simocollector.sender import CPUSender
+
+
+class FakeSender(object):
+    name = 'memory'
+    aggregated_fields = ('percent_used', )
+
+    def __init__(self):
+        self.value = 0
+
+    def sample(self):
+        self.value += 10
+        return {'percent_used': self.value}
+
+
+class SamplerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.time = time.time
+
+    def tearDown(self):
+        time.time = self.time
+
+    def test_wall_clock_step_does_not_break_windows(self):
+        sampler = Sampler([FakeSender()], rate=1)
+        sampler.sample()
+        sampler.sample()
+        # Samples of the clock tick of a report go to the next one
+        time.sleep(0.02)
+        self.assertEqual(sampler.take('memory')['percent_used_max'], 20)
+
+        # NTP steps the wall clock an hour back
+        now = self.time()
+        time.time = lambda: now - 3600
+        sampler.sample()
+        time.sleep(0.02)
+        self.assertEqual(sampler.take('memory'), {'percent_used_min': 30, 'percent_used_max': 30,
+                                                  'percent_used_mean': 30.0, 'percent_used_p95': 30.0})
+
+
+class CPUSamplesTest(unittest.TestCase):
+
+    def test_first_sample_since_boot_is_discarded(self):
+        sender = CPUSender({'server': 'http://simo', 'server_id': 'http://simo/api/server/1/', 'username': 'simo',
+                            'password': 'simo'})
+        self.assertEqual(sender.sample(), None)
+        self.assertEqual(sorted(sender.sample().keys())[:3], ['idle', 'iowait', 'irq'])
+
+    def test_fields_missing_on_older_kernels_are_not_aggregated(self):
+        root = tempfile.mkdtemp()
+        try:
+            sender = CPUSender({'server': 'http://simo', 'server_id': 'http://simo/api/server/1/',
+                                'username': 'simo', 'password': 'simo', 'collector_backend': 'procfs',
+                                'procfs_root': root})
+            sampler = Sampler([sender], rate=1)
+            # Kernels before 2.6.11 have no steal time
+            for user in (100, 200, 300):
+                with open(os.path.join(root, 'stat'), 'w') as f:
+                    f.write('cpu  {0} 0 100 1000 10 0 0\n'.format(user))
+                sampler.sample()
+            time.sleep(0.02)
+            result = sampler.take('cpu')
+        finally:
+            shutil.rmtree(root)
+
+        self.assertTrue('user_max' in result)
+        self.assertFalse('steal_max' in result)
+
+
+if __name__ == '__main__':
+    unittest.main()
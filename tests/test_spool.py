@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import errno
+import shutil
+import tempfile
+import threading
+import unittest
+
+from simocollector.spool import Spool
+
+
+class SpoolReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.spool = Spool(self.path)
+        for i in range(3):
+            self.spool.append('/api/memory/', {'i': i})
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def get_spooled(self):
+        return [r['data']['i'] for name in self.spool.get_segments() for r in self.spool._read_segment(name)]
+
+    def test_append_is_not_blocked_by_replay(self):
+        sending = threading.Event()
+
+        def send(url, data):
+            sending.set()
+            time.sleep(0.2)
+
+        thread = threading.Thread(target=self.spool.replay, args=(send,))
+        thread.start()
+        sending.wait()
+        started = time.time()
+        self.spool.append('/api/memory/', {'i': 3})
+        self.assertTrue(time.time() - started < 0.1)
+        thread.join()
+
+        self.assertEqual(self.get_spooled(), [3])
+
+    def test_records_not_sent_stay_first(self):
+        def send(url, data):
+            if data['i'] == 1:
+                raise IOError('Server is down')
+
+        self.assertRaises(IOError, self.spool.replay, send)
+        self.spool.append('/api/memory/', {'i': 3})
+        self.assertEqual(self.get_spooled(), [1, 2, 3])
+
+    def test_claim_of_dead_process_is_released(self):
+        name = self.spool.get_segments()[0]
+        # Pids are below 2 ** 22 on Linux
+        os.rename(os.path.join(self.path, name), os.path.join(self.path, name + '.99999999.claimed'))
+        self.assertEqual(self.spool.get_segments(), [])
+
+        self.assertEqual(self.spool.replay(lambda url, data: None), 3)
+        self.assertEqual(os.listdir(self.path), ['.lock'])
+
+    def test_claim_of_process_of_another_user_is_kept(self):
+        name = self.spool.get_segments()[0]
+        os.rename(os.path.join(self.path, name), os.path.join(self.path, name + '.99999999.claimed'))
+
+        def kill(pid, signal):
+            raise OSError(errno.EPERM, 'Operation not permitted')
+
+        original_kill = os.kill
+        os.kill = kill
+        try:
+            self.assertEqual(self.spool.replay(lambda url, data: None), 0)
+        finally:
+            os.kill = original_kill
+        self.assertEqual(sorted(os.listdir(self.path)), ['.lock', name + '.99999999.claimed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from simocollector.stats import stats, get_stats_summary
+
+
+class StatsSummaryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.config = {'stats_file': os.path.join(self.work_dir, 'stats.json')}
+        stats.snapshot(reset=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_summary_covers_values_since_previous_summary(self):
+        stats.observe('http./api/memory/', 5000)
+        stats.increment('sender.memory.payloads')
+        first = get_stats_summary(self.config)
+
+        stats.observe('http./api/memory/', 10)
+        stats.increment('sender.memory.payloads')
+        second = get_stats_summary(self.config)
+
+        self.assertEqual(first['http./api/memory/.max_ms'], 5000)
+        self.assertEqual(second['http./api/memory/.count'], 1)
+        self.assertEqual(second['http./api/memory/.max_ms'], 10)
+        self.assertEqual(second['sender.memory.payloads'], 1)
+
+    def test_file_keeps_totals(self):
+        stats.increment('sender.memory.payloads')
+        get_stats_summary(self.config)
+        stats.increment('sender.memory.payloads')
+        totals = stats.flush(self.config['stats_file'])
+
+        self.assertEqual(totals['counters']['sender.memory.payloads'], 2)
+        self.assertEqual(totals['window']['counters'], {'sender.memory.payloads': 1})
+
+    def test_first_flush_creates_file(self):
+        stats.increment('sender.memory.payloads')
+        totals = stats.flush(self.config['stats_file'])
+
+        self.assertEqual(totals['counters'], {'sender.memory.payloads': 1})
+        self.assertEqual(totals['window']['counters'], {'sender.memory.payloads': 1})
+        self.assertTrue(os.path.exists(self.config['stats_file']))
+        self.assertFalse(os.path.exists(self.config['stats_file'] + '.tmp'))
+
+    def test_summary_without_file(self):
+        stats.increment('sender.memory.payloads')
+        self.assertEqual(get_stats_summary({'stats_file': None})['sender.memory.payloads'], 1)
+        self.assertEqual(get_stats_summary({'stats_file': None}), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
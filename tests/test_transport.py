@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import time
+import urllib2
+import unittest
+
+from simocollector.mockserver import MockSimoServer
+from simocollector.transport import ConnectionPool
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.simo = MockSimoServer().start()
+        self.pool = ConnectionPool()
+        self.url = '{0}/api/memory/'.format(self.simo.url)
+
+    def tearDown(self):
+        self.pool.clear()
+        self.simo.stop()
+
+    def post(self, timeout=5):
+        return self.pool.urlopen(self.url, '{}', {'Content-Type': 'application/json'}, timeout=timeout)
+
+    def test_stale_connection_is_retried_once(self):
+        self.post()
+        # The server drops the idle keep-alive connection
+        self.simo.httpd.close_connections()
+
+        self.assertEqual(self.post().code, 201)
+        self.assertEqual(len(self.simo.requests), 2)
+
+    def test_timeout_is_not_retried(self):
+        self.post()
+        self.simo.latency = 0.3
+
+        self.assertRaises(urllib2.URLError, self.post, 0.1)
+        time.sleep(0.5)
+        self.assertEqual(len(self.simo.requests), 2)
+
+    def test_error_on_new_connection_is_raised(self):
+        self.simo.stop()
+        self.assertRaises(urllib2.URLError, self.post)
+
+
+if __name__ == '__main__':
+    unittest.main()